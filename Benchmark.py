@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import statistics
+import sqlglot
+from sqlglot import parse_one
+from sqlglot.optimizer import optimize
+from EquiMatch_with_Err import get_alias_map, match_aliases, normalize_expression, expressions_equal
+from ExecMatch_with_Err import execute_sql, compare_exec_results
+from SQLitePool import ConnectionPool
+from getSQLtables import extract_table_names
+
+# 合成数据库中的表数量，JOIN 链循环使用这些表
+TABLE_COUNT = 4
+
+def make_database(db_path, rows: int = 10000, seed: int = 0):
+    """
+    生成合成的 SQLite 数据库：TABLE_COUNT 张结构相同的表 t0..t3，
+    每张表 `rows` 行，列为 id（主键）、k（指向下一张表的 id）、grp（0-9 分组）、name、val。
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    connection = sqlite3.connect(db_path)
+    try:
+        for t in range(TABLE_COUNT):
+            connection.execute(f"CREATE TABLE t{t} (id INTEGER PRIMARY KEY, k INTEGER, grp INTEGER, name TEXT, val REAL)")
+            connection.executemany(
+                f"INSERT INTO t{t} VALUES (?, ?, ?, ?, ?)",
+                ((i, (i * 7 + seed + t) % rows, i % 10, f"n{(i * 31 + t) % 997}", ((i * 13 + seed) % 1000) / 10.0)
+                 for i in range(rows)),
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+def table_rows(db_path) -> int:
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM t0").fetchone()[0]
+    finally:
+        connection.close()
+
+def select_width(n: int) -> tuple:
+    columns = [f"t0.val + {i} AS c{i}" for i in range(n)]
+    gold = f"SELECT t0.id, {', '.join(columns)} FROM t0 WHERE t0.grp = 1"
+    # 预测SQL：列别名不同、列顺序相反
+    pred = f"SELECT {', '.join(f'a.val + {i} AS x{i}' for i in reversed(range(n)))}, a.id FROM t0 AS a WHERE a.grp = 1"
+    return gold, pred
+
+def join_count(n: int) -> tuple:
+    def build(prefix):
+        joins = " ".join(
+            f"JOIN t{i % TABLE_COUNT} AS {prefix}{i} ON {prefix}{i - 1}.k = {prefix}{i}.id" for i in range(1, n + 1)
+        )
+        return f"SELECT {prefix}0.id, {prefix}{n}.name FROM t0 AS {prefix}0 {joins} WHERE {prefix}0.grp = 2"
+    return build("a"), build("b")
+
+def cte_depth(n: int) -> tuple:
+    def build(prefix):
+        ctes = [f"{prefix}0 AS (SELECT id, grp, val FROM t0 WHERE val > 10)"]
+        for i in range(1, n):
+            ctes.append(f"{prefix}{i} AS (SELECT id, grp, val FROM {prefix}{i - 1} WHERE val > {10 + i})")
+        return f"WITH {', '.join(ctes)} SELECT grp, COUNT(*) AS cnt FROM {prefix}{n - 1} GROUP BY grp"
+    return build("a"), build("b")
+
+def case_branches(n: int) -> tuple:
+    def build(alias):
+        branches = " ".join(f"WHEN {alias}.val < {(i + 1) * 100.0 / n:.4f} THEN 'b{i}'" for i in range(n))
+        return f"SELECT {alias}.id, CASE {branches} ELSE 'other' END AS bucket FROM t0 AS {alias}"
+    return build("a"), build("b")
+
+def in_list(n: int) -> tuple:
+    values = [str(i * 3) for i in range(n)]
+    gold = f"SELECT id, name FROM t1 WHERE id IN ({', '.join(values)})"
+    pred = f"SELECT b.id, b.name FROM t1 AS b WHERE b.id IN ({', '.join(reversed(values))})"
+    return gold, pred
+
+# 复杂度维度：名称 -> 生成 (真实SQL, 预测SQL) 的函数
+GENERATORS = {
+    "select_width": select_width,
+    "join_count": join_count,
+    "cte_depth": cte_depth,
+    "case_branches": case_branches,
+    "in_list": in_list,
+}
+
+def time_phases(gold_sql: str, pred_sql: str, pool: ConnectionPool, dialect: str = "sqlite") -> dict:
+    """
+    对一对 SQL 分阶段计时（秒），不经过 sql_cache，每次都完整解析：
+    parse / optimize / alias（别名映射与替换）/ compare（结构比较）/ tables（extract_table_names）/
+    execute（两条查询执行并转换为 DataFrame）/ exec_compare（结果比较）。
+    """
+    timings = {}
+
+    def timed(phase, fn):
+        start = time.perf_counter()
+        result = fn()
+        timings[phase] = time.perf_counter() - start
+        return result
+
+    expr1, expr2 = timed("parse", lambda: (parse_one(gold_sql, dialect=dialect), parse_one(pred_sql, dialect=dialect)))
+    expr1, expr2 = timed("optimize", lambda: (optimize(expr1), optimize(expr2)))
+
+    def align():
+        memo = {}
+        mapping = match_aliases(get_alias_map(expr1), get_alias_map(expr2), memo)
+        return normalize_expression(expr1, mapping), memo
+    normalized, memo = timed("alias", align)
+    timed("compare", lambda: expressions_equal(normalized, expr2, memo))
+    timed("tables", lambda: (extract_table_names(gold_sql), extract_table_names(pred_sql)))
+
+    connection = pool.connection()
+    pred_result, gold_result = timed("execute", lambda: (execute_sql(pred_sql, connection), execute_sql(gold_sql, connection)))
+    timed("exec_compare", lambda: compare_exec_results(pred_result, gold_result, gold_sql))
+    timings["total"] = sum(timings.values())
+    return timings
+
+def peak_memory(gold_sql: str, pred_sql: str, pool: ConnectionPool) -> float:
+    """
+    用 tracemalloc 测量一次完整评估的 Python 内存峰值（KiB），单独运行，不影响计时。
+    """
+    tracemalloc.start()
+    try:
+        time_phases(gold_sql, pred_sql, pool)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+def run_benchmark(db_path, levels=(1, 4, 16, 64), repeat: int = 5, generators=None) -> dict:
+    """
+    按各复杂度维度和级别运行基准测试，每个用例重复 `repeat` 次，各阶段取中位数。
+
+    :return: {"meta": 环境信息, "cases": {"维度-级别": {阶段: 秒, "throughput": 对/秒, "peak_kib": KiB}}}
+    """
+    generators = generators or GENERATORS
+    pool = ConnectionPool(db_path, immutable=True)
+    cases = {}
+    try:
+        for name, generate in generators.items():
+            for level in levels:
+                gold_sql, pred_sql = generate(level)
+                time_phases(gold_sql, pred_sql, pool)  # 预热
+                runs = [time_phases(gold_sql, pred_sql, pool) for _ in range(repeat)]
+                case = {phase: statistics.median(run[phase] for run in runs) for phase in runs[0]}
+                case["throughput"] = 1.0 / case["total"] if case["total"] > 0 else float("inf")
+                case["peak_kib"] = peak_memory(gold_sql, pred_sql, pool)
+                cases[f"{name}-{level}"] = case
+    finally:
+        pool.close()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "sqlglot": sqlglot.__version__,
+            "sqlite": sqlite3.sqlite_version,
+            "db_rows": table_rows(db_path),
+            "repeat": repeat,
+        },
+        "cases": cases,
+    }
+
+def compare_baseline(results: dict, baseline: dict, tolerance: float = 0.25, min_seconds: float = 5e-4) -> list:
+    """
+    与基线比较，返回回退项 [(用例, 指标, 基线值, 当前值, 比例)]：
+    耗时类指标超过基线的 (1 + tolerance) 倍且差值大于 min_seconds，或内存峰值超过基线的 (1 + tolerance) 倍。
+    """
+    regressions = []
+    for case_name, case in results["cases"].items():
+        base = baseline.get("cases", {}).get(case_name)
+        if base is None:
+            continue
+        for metric, value in case.items():
+            old = base.get(metric)
+            if old is None or metric == "throughput" or value != value or old != old:
+                continue
+            if metric == "peak_kib":
+                regressed = value > old * (1 + tolerance)
+            else:
+                regressed = value > old * (1 + tolerance) and value - old > min_seconds
+            if regressed:
+                regressions.append((case_name, metric, old, value, value / old if old else float("inf")))
+    return regressions
+
+def format_report(results: dict) -> str:
+    phases = ["parse", "optimize", "alias", "compare", "tables", "execute", "exec_compare", "total"]
+    lines = [f"{'case':<20}" + "".join(f"{p:>13}" for p in phases) + f"{'pairs/s':>10}{'peak KiB':>10}"]
+    for case_name, case in results["cases"].items():
+        lines.append(
+            f"{case_name:<20}" + "".join(f"{case[p] * 1000:>11.3f}ms" for p in phases)
+            + f"{case['throughput']:>10.1f}{case['peak_kib']:>10.0f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    # 用法: python Benchmark.py --baseline bench.json [--save] [--rows 10000] [--levels 1,4,16,64] [--repeat 5]
+    parser = argparse.ArgumentParser(description="SQL_Evaluation 匹配器基准测试")
+    parser.add_argument("--db", help="合成数据库路径（默认在临时目录生成）")
+    parser.add_argument("--rows", type=int, default=10000, help="合成数据库每张表的行数")
+    parser.add_argument("--levels", default="1,4,16,64", help="各维度的复杂度级别，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", help="基线文件（JSON）")
+    parser.add_argument("--save", action="store_true", help="将本次结果写入基线文件")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的相对回退幅度")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.gettempdir(), f"sql_evaluation_bench_{args.rows}.sqlite")
+    if not os.path.exists(db_path) or table_rows(db_path) != args.rows:
+        make_database(db_path, args.rows)
+    results = run_benchmark(db_path, [int(level) for level in args.levels.split(",")], args.repeat)
+    print(format_report(results))
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("sqlglot") != results["meta"]["sqlglot"]:
+            print(f"[INFO] sqlglot {baseline['meta'].get('sqlglot')} -> {results['meta']['sqlglot']}")
+        regressions = compare_baseline(results, baseline, args.tolerance)
+        for case_name, metric, old, value, ratio in regressions:
+            print(f"[REGRESSION] {case_name} {metric}: {old:.6g} -> {value:.6g} ({ratio:.2f}x)")
+        if not regressions:
+            print("No regressions against baseline.")
+    if args.baseline and args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Baseline saved to {args.baseline}")
+    sys.exit(1 if regressions else 0)
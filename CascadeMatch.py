@@ -0,0 +1,118 @@
+import time
+from Fingerprint import fingerprint
+from EquiMatch_with_Err import is_equi_match, sql_cache
+from ExecMatch_with_Err import is_exec_match
+
+# 各层按开销从低到高排列
+TIERS = ["fingerprint", "equi", "exec", "llm"]
+
+# is_exec_match 中表示无法得出结论（执行失败、超时）的信息前缀
+EXEC_ERRORS = ("Error executing SQL query", "Gold SQL design error", "Timeout")
+
+def fingerprint_match(sql1: str, sql2: str, dialect: str = "sqlite"):
+    """
+    快速结构检查：只解析、不优化（SQLCache.summary，解析结果留给 equi 层优化时复用），
+    两棵语法树的指纹相同时再确认两者完全相同（包括别名，忽略空白、关键字大小写和注释）。
+    未优化的语法树中别名决定列引用的含义，因此不能像 equi 层那样忽略别名；
+    不同不代表不等价（别名、表达式写法不同），只作为正向判断。
+    """
+    try:
+        _, expr1 = sql_cache.summary(sql1, dialect)
+        _, expr2 = sql_cache.summary(sql2, dialect)
+    except Exception as e:
+        return False, f"Error parsing SQL: {e}"
+    if fingerprint(expr1) != fingerprint(expr2):
+        return False, "Fingerprint mismatch."
+    try:
+        same = expr1 == expr2
+    except RecursionError:
+        # sqlglot 递归比较语法树，过深时交给 equi 层
+        return False, "Syntax tree too deep to compare."
+    return (True, None) if same else (False, "Syntax tree mismatch.")
+
+def cascade_match(gold_sql, pred_sql, db_path, judge=None, dialect: str = "sqlite", exec_options=None) -> dict:
+    """
+    分层评估两条 SQL 是否等价，只在前面几层无法得出结论时才进入开销更大的下一层：
+    1. fingerprint：未优化的语法树完全相同即判定等价（见 fingerprint_match）；
+    2. equi：is_equi_match 判定等价即结束；
+    3. exec：is_exec_match，与 equi 的结论一致（都不等价）时结束；
+    4. llm：AST 判定不等价而执行结果一致，或解析和执行都失败时，才调用 judge。
+
+    :param judge: LLM 判断函数 judge(sql1, sql2) -> {"result": bool, "reason": str}，如 EquiMatch_with_LLM.LLMJudge 实例；
+        为 None 时不调用 LLM，需要 LLM 的样本以执行结果为准，并标记 llm_needed
+    :param exec_options: 传给 is_exec_match 的其他参数（ignore_extra_columns / timeout / streaming 等）
+    :return: {"match": 最终结论, "decided_by": 做出结论的层, "llm_needed": 是否需要 LLM,
+              "tiers": {层名: {"result", "msg", "error", "seconds"}}}，未执行的层不出现在 tiers 中
+    """
+    record = {"match": False, "decided_by": None, "llm_needed": False, "tiers": {}}
+
+    def run(tier, fn):
+        # 某一层抛出异常时记为该层失败（error=True），不中断整个评估
+        start = time.perf_counter()
+        try:
+            result, msg = fn()
+            error = False
+        except Exception as e:
+            result, msg, error = False, f"{type(e).__name__}: {e}", True
+        record["tiers"][tier] = {"result": result, "msg": msg, "error": error, "seconds": time.perf_counter() - start}
+        return result, msg
+
+    def decide(tier, result):
+        record["match"] = bool(result)
+        record["decided_by"] = tier
+        return record
+
+    matched, _ = run("fingerprint", lambda: fingerprint_match(gold_sql, pred_sql, dialect))
+    if matched:
+        return decide("fingerprint", True)
+
+    equi, equi_msg = run("equi", lambda: is_equi_match(gold_sql, pred_sql, dialect, diagnostics="summary")[2:])
+    if equi:
+        return decide("equi", True)
+
+    exec_match, exec_msg = run("exec", lambda: is_exec_match(pred_sql, gold_sql, db_path, **(exec_options or {})))
+    equi_failed = record["tiers"]["equi"]["error"] or bool(equi_msg) and equi_msg.startswith("Error parsing SQL")
+    exec_failed = record["tiers"]["exec"]["error"] or bool(exec_msg) and exec_msg.startswith(EXEC_ERRORS)
+    if not exec_match and not (equi_failed and exec_failed):
+        # AST 与执行结果都判定不等价
+        return decide("exec", False)
+
+    # AST 与执行结果不一致，或两者都无法得出结论
+    record["llm_needed"] = True
+    if judge is None:
+        return decide("exec", exec_match)
+
+    def ask():
+        verdict = judge(gold_sql, pred_sql)
+        if verdict["result"] is None:  # 请求失败或回复无法解析
+            raise ValueError(verdict.get("reason"))
+        return bool(verdict["result"]), verdict.get("reason")
+
+    llm, _ = run("llm", ask)
+    if record["tiers"]["llm"]["error"]:
+        return decide("exec", exec_match)
+    return decide("llm", llm)
+
+def summarize_cascade(records) -> dict:
+    """
+    汇总 cascade_match 的结果：各层做出结论的样本数、调用 LLM 的比例，以及各层的调用次数和平均耗时。
+    """
+    records = list(records)
+    summary = {
+        "total": len(records),
+        "decided_by": {tier: 0 for tier in TIERS},
+        "llm_needed": sum(record["llm_needed"] for record in records),
+        "llm_calls": 0,
+        "tiers": {},
+    }
+    for record in records:
+        summary["decided_by"][record["decided_by"]] += 1
+    for tier in TIERS:
+        seconds = [record["tiers"][tier]["seconds"] for record in records if tier in record["tiers"]]
+        summary["tiers"][tier] = {
+            "calls": len(seconds),
+            "mean_seconds": sum(seconds) / len(seconds) if seconds else 0.0,
+        }
+    summary["llm_calls"] = summary["tiers"]["llm"]["calls"]
+    summary["llm_ratio"] = summary["llm_calls"] / len(records) if records else 0.0
+    return summary
@@ -0,0 +1,71 @@
+import os
+import json
+import hashlib
+import threading
+
+def config_hash(**config) -> str:
+    """
+    评测配置的哈希（数据集、数据库标识、评测参数等），任一变化时旧的检查点记录不再使用。
+    """
+    text = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def row_key(index: int, *values) -> str:
+    """
+    数据集中一行的标识：行号加上该行内容，数据集中的行被修改后不会误用旧结果。
+    """
+    text = json.dumps([index, *values], ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+class Checkpoint:
+    """
+    评测检查点（JSON Lines）：每行评测完成后立即追加一条记录并刷新到磁盘，
+    中断后重新运行时跳过已完成的行。每条记录带有配置哈希，只有配置相同的记录会被读取。
+
+    :param path: 检查点文件路径，不存在时自动创建
+    :param config: config_hash 得到的配置哈希
+    """
+
+    def __init__(self, path, config: str):
+        self.path = path
+        self.config = config
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self) -> dict:
+        """
+        读取当前配置下已完成的行，返回 {row_key: record}。写到一半的最后一行（进程被中断）会被忽略。
+        """
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("config") == self.config:
+                    records[entry["key"]] = entry["row"]
+        return records
+
+    def append(self, key: str, record: dict):
+        line = json.dumps({"config": self.config, "key": key, "row": record}, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+                # 上次中断时最后一行可能没有写完，先换行，避免与新记录拼在一起
+                if self._file.tell() > 0:
+                    with open(self.path, "rb") as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b"\n":
+                            self._file.write("\n")
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
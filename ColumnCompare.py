@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from ResultDigest import value_token
+
+def prepare_column(series, ordered=False) -> tuple:
+    """
+    将结果列转换为按类型比较的形式：
+    - 数值列保持为 float64 NumPy 数组（NULL 为 NaN），向量化排序与比较；
+    - 其他列转换为值 token 序列，精确比较。
+    ordered 为假时对列排序（忽略行顺序）。
+    """
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        if not ordered:
+            values = np.sort(values)  # NaN 排在最后
+        return "numeric", values
+    tokens = [value_token(v) for v in series]
+    if not ordered:
+        tokens.sort()
+    return "text", tokens
+
+def columns_close(col1: tuple, col2: tuple, rtol=0.0, atol=0.0) -> bool:
+    kind1, values1 = col1
+    kind2, values2 = col2
+    if kind1 != kind2 or len(values1) != len(values2):
+        return False
+    if kind1 == "numeric":
+        return bool(np.allclose(values1, values2, rtol=rtol, atol=atol, equal_nan=True))
+    return values1 == values2
+
+def prepare_value_set(series) -> tuple:
+    """
+    结果列的值集合（去重并排序），形式同 prepare_column，用于宽松模式下按容差对齐列。
+    """
+    kind, values = prepare_column(series)
+    if kind == "numeric":
+        return kind, np.unique(values)  # 多个 NaN 合并为一个
+    return kind, sorted(set(values))
+
+def match_columns_close(pred_result, gold_result, rtol=0.0, atol=0.0, one_to_one=False) -> list:
+    """
+    按容差对齐列（宽松模式）：与 ExecMatch.match_columns_by_values 相同，但比较的是两列去重后的值集合，
+    数值列在容差内视为相等。返回预测结果中匹配列的位置；`one_to_one` 为真时每个真实列最多匹配一次。
+    """
+    gold_sets = [prepare_value_set(gold_result.iloc[:, j]) for j in range(gold_result.shape[1])]
+    candidates = list(range(len(gold_sets)))
+    common_columns = []
+    for i in range(pred_result.shape[1]):
+        pred_set = prepare_value_set(pred_result.iloc[:, i])
+        for j in candidates:
+            if columns_close(pred_set, gold_sets[j], rtol, atol):
+                common_columns.append(i)
+                if one_to_one:
+                    candidates.remove(j)
+                break
+    return common_columns
+
+def compare_columns_typed(pred_result, gold_result, ordered=False, rtol=0.0, atol=0.0) -> bool:
+    """
+    按类型逐列比较两个查询结果（忽略列顺序）：数值列在容差 |a - b| <= atol + rtol * |b| 内视为相等，
+    适合 SUM、百分比、ROUND(...) 等浮点结果；字符串等其他列精确比较。
+    """
+    if pred_result.shape != gold_result.shape:
+        return False
+
+    pred_columns = [prepare_column(pred_result.iloc[:, i], ordered) for i in range(pred_result.shape[1])]
+    gold_columns = [prepare_column(gold_result.iloc[:, j], ordered) for j in range(gold_result.shape[1])]
+
+    # 每个真实列最多匹配一次
+    for pred_column in pred_columns:
+        for j, gold_column in enumerate(gold_columns):
+            if columns_close(pred_column, gold_column, rtol, atol):
+                gold_columns.pop(j)
+                break
+        else:
+            return False
+    return True
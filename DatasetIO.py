@@ -0,0 +1,58 @@
+import os
+import json
+import pandas as pd
+
+def is_jsonl(path) -> bool:
+    return str(path).lower().endswith((".jsonl", ".ndjson"))
+
+def read_dataset(dataset_path, chunk_size: int = 1000):
+    """
+    逐块读取数据集（CSV 或 JSON Lines，按扩展名判断），逐行产出 dict，不把整个文件读入内存。
+    """
+    if is_jsonl(dataset_path):
+        with open(dataset_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        return
+    for chunk in pd.read_csv(dataset_path, chunksize=chunk_size):
+        yield from chunk.to_dict("records")
+
+class ResultWriter:
+    """
+    增量写出评测结果（CSV 或 JSON Lines，按扩展名判断）：每攒够 `chunk_size` 行追加写入一次，
+    列顺序取第一行的字段顺序。已存在的输出文件会被覆盖。
+    """
+
+    def __init__(self, output_path, chunk_size: int = 1000):
+        self.output_path = output_path
+        self.chunk_size = chunk_size
+        self.columns = None
+        self.rows_written = 0
+        self._buffer = []
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+    def write(self, row: dict):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        if self.columns is None:
+            self.columns = list(self._buffer[0])
+        if is_jsonl(self.output_path):
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                for row in self._buffer:
+                    f.write(json.dumps({c: row.get(c) for c in self.columns}, ensure_ascii=False, default=str) + "\n")
+        else:
+            pd.DataFrame(self._buffer, columns=self.columns).to_csv(
+                self.output_path, mode="a", header=self.rows_written == 0, index=False)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
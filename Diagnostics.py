@@ -0,0 +1,42 @@
+# 诊断级别：
+# off     只返回结论，比较过程中不生成任何信息；
+# summary 返回 (结论, 简短信息)，不渲染 SQL 文本；
+# full    返回 (结论, 完整信息)，与原 *_with_Err 模块的信息相同
+LEVELS = ("off", "summary", "full")
+
+def check_level(level: str):
+    if level not in LEVELS:
+        raise ValueError(f"Unknown diagnostics level: {level!r}, expected one of {LEVELS}")
+
+class Mismatch:
+    """
+    第一处不匹配的轻量记录：类型 `kind` 和相关对象（语法树节点、异常等）的引用。
+    比较时只创建该对象，信息文本在调用 message() 时才渲染。
+    """
+
+    __slots__ = ("kind", "left", "right", "context")
+
+    def __init__(self, kind: str, left=None, right=None, context=None):
+        self.kind = kind
+        self.left = left
+        self.right = right
+        self.context = context
+
+    def message(self, level: str = "full") -> str:
+        raise NotImplementedError
+
+    def __str__(self):
+        return self.message("full")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.kind!r})"
+
+def report(mismatch, level: str):
+    """
+    按诊断级别返回比较结果：off 时为 bool，否则为 (bool, 信息)，一致时信息为 None。
+    """
+    if level == "off":
+        return mismatch is None
+    if mismatch is None:
+        return True, None
+    return False, mismatch.message(level)
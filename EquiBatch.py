@@ -0,0 +1,61 @@
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+from SQLCache import SQLCache
+from EquiMatch_with_Err import is_equi_match, sql_cache, get_alias_map
+from GoldPack import load_gold_pack
+
+def _init_worker(dialect: str, cache_size: int, gold_pack_path, cache: SQLCache = None):
+    """
+    工作进程初始化，每个进程只执行一次：调整解析缓存容量、预加载 gold pack 中的语法树，
+    并用一条简单 SQL 预热 sqlglot（方言、解析器和优化规则的首次调用开销不计入任务）。
+    `cache` 默认为工作进程中 EquiMatch_with_Err 的 sql_cache。
+    """
+    cache = cache or sql_cache
+    cache.resize(cache_size)
+    if gold_pack_path:
+        pack = load_gold_pack(gold_pack_path)
+        if pack is not None and pack.dialect == dialect:
+            pack.install(cache)
+    is_equi_match("SELECT 1", "SELECT 1", dialect, cache=cache)
+
+def _match_chunk(chunk, dialect: str, diagnostics: str = "full", cache: SQLCache = None) -> list:
+    return [is_equi_match(sql1, sql2, dialect, diagnostics, cache=cache) for sql1, sql2 in chunk]
+
+def batch_equi_match(pairs, dialect: str = "sqlite", workers: int = None, chunksize: int = None,
+                     gold_pack_path=None, cache_size: int = 1024, diagnostics: str = "full") -> list:
+    """
+    用进程池批量判断 SQL 对是否等价，绕开 GIL，适合离线评测大量 SQL 对。
+
+    :param pairs: [(sql1, sql2), ...]，与 is_equi_match 的参数顺序相同（通常为 (真实SQL, 预测SQL)）
+    :param dialect: SQL 方言
+    :param workers: 进程数，默认为 CPU 核数；为 1 时在当前进程中顺序执行（使用按 cache_size / gold_pack_path 设置的单独解析缓存）
+    :param chunksize: 每个任务包含的 SQL 对数，默认约为 len(pairs) / (workers * 4)；
+        按输入顺序连续切分，相邻的相同真实SQL落在同一进程中，可以命中该进程的解析缓存
+    :param gold_pack_path: 可选的 gold pack 路径，每个工作进程启动时预加载其中的语法树
+    :param cache_size: 每个工作进程的解析缓存容量
+    :param diagnostics: 诊断级别，见 EquiMatch_with_Err.is_equi_match
+    :return: 与输入顺序一致的 [(equi_gold, equi_pred, match, msg), ...]，与 EquiMatch_with_Err.is_equi_match 相同
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return []
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(pairs))
+    if workers <= 1:
+        # 当前进程中使用单独的解析缓存，不改变 sql_cache 的容量和预加载的条目
+        cache = SQLCache(get_alias_map)
+        _init_worker(dialect, cache_size, gold_pack_path, cache)
+        return _match_chunk(pairs, dialect, diagnostics, cache)
+
+    if chunksize is None:
+        chunksize = math.ceil(len(pairs) / (workers * 4))
+    chunksize = max(1, chunksize)
+    chunks = [pairs[i:i + chunksize] for i in range(0, len(pairs), chunksize)]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(dialect, cache_size, gold_pack_path)) as executor:
+        for chunk_results in executor.map(_match_chunk, chunks, [dialect] * len(chunks), [diagnostics] * len(chunks)):
+            results.extend(chunk_results)
+    return results
@@ -1,11 +1,15 @@
-from sqlglot import parse_one
-from sqlglot.optimizer import optimize
-from sqlglot.expressions import Expression, Alias, Column, Window, CTE, Identifier, Table, TableAlias
+from sqlglot.expressions import Expression, Alias, Column, Window, CTE, Identifier, Table, TableAlias, Literal
+from Fingerprint import fingerprint, filter_args, build_fingerprint_index, scalar_token, is_chain, chain_operands
+from SQLCache import SQLCache
+from Instrument import measure
+from Diagnostics import Mismatch, check_level, report
+from Prefilter import reject_reason, prefilter_stats
 
-def get_alias_map(expression: Expression) -> dict:
+def get_alias_map(expression: Expression, table_aliases: bool = False) -> dict:
     """
     提取 SQL 语法树中的别名映射，包括普通表别名、子查询别名（CTE）、窗口函数别名。
     注意：在建立映射时忽略别名，只匹配结构。
+    `table_aliases` 为真时同时记录表别名（EquiMatch_with_Err 的规则）。
     """
     alias_map = {}
     for node in expression.walk():
@@ -13,18 +17,29 @@ def get_alias_map(expression: Expression) -> dict:
             alias_map[node.alias] = node.this  # 记录别名映射
         elif isinstance(node, CTE):
             alias_map[node.alias] = node  # 将 CTE 别名加入映射
+        elif table_aliases and isinstance(node, TableAlias) and isinstance(node.parent, Table):
+            alias = node.this.this  # 表别名（如 "d", "dp"）
+            actual_table = node.parent  # 实际 Table 节点
+            alias_map[alias] = actual_table
     return alias_map
 
-def match_aliases(alias_map_sql1: dict, alias_map_sql2: dict) -> dict:
+# 解析/优化结果缓存，可通过 sql_cache.resize(n) 调整容量，sql_cache.stats() 查看命中情况
+sql_cache = SQLCache(get_alias_map)
+
+def match_aliases(alias_map_sql1: dict, alias_map_sql2: dict, memo: dict = None) -> dict:
     """
     匹配 SQL1 和 SQL2 之间的等价别名：只关注查询结构，而非别名。
+    SQL2 的别名映射按结构指纹建立索引，只对指纹相同的候选进行完整比较。
     """
+    if memo is None:
+        memo = {}
     alias_mapping = {}
 
     # 获取查询1与查询2之间的严格对应关系，忽略别名，专注结构匹配
+    index_sql2 = build_fingerprint_index(alias_map_sql2, memo)
     for alias1, node1 in alias_map_sql1.items():
-        for alias2, node2 in alias_map_sql2.items():
-            if expressions_equal(node1, node2):  # 按照结构匹配
+        for alias2, node2 in index_sql2.get(fingerprint(node1, memo), ()):
+            if expressions_equal(node1, node2, memo):  # 按照结构匹配
                 alias_mapping[alias1] = alias2
 
     return alias_mapping
@@ -34,95 +49,240 @@ def normalize_expression(expression: Expression, alias_mapping: dict) -> Express
     替换查询2中的别名，使其结构与查询1一致，确保别名映射正确。
     只替换所有 Identifier 中的 `this` 属性，忽略其他字段。
     `alias_mapping` 使用字符串作为映射。
+    没有需要替换的标识符时直接返回原表达式，不做拷贝；否则在拷贝上替换，不修改原语法树。
     """
-    expression = expression.copy()
+    if not alias_mapping:
+        return expression
 
-    for node in expression.walk():
-        # 只替换 Identifier 节点中的 `this` 属性
-        if isinstance(node, Identifier):
-            if node.this in alias_mapping:
-                # 替换 `this` 属性，直接使用字符串作为 `this`
-                node.args["this"] = alias_mapping[node.this]  # 使用字符串替换 `this`
+    # 先在原树上定位需要替换的 Identifier（按遍历顺序记录下标）
+    targets = {
+        i for i, node in enumerate(expression.find_all(Identifier))
+        if node.this in alias_mapping
+    }
+    if not targets:
+        return expression
+
+    expression = expression.copy()
+    # 拷贝与原树结构相同，遍历顺序一致
+    for i, node in enumerate(expression.find_all(Identifier)):
+        if i in targets:
+            # 替换 `this` 属性，直接使用字符串作为 `this`
+            node.args["this"] = alias_mapping[node.this]
 
     return expression
 
-def compare_lists_unordered(list1, list2):
+def compare_lists_unordered(list1, list2, memo: dict = None):
     """
-    比较两个列表的元素，无视顺序，递归比较每个元素。
+    比较两个列表的元素，无视顺序。
+    先按结构指纹分桶做多重集合比较，只对指纹相同的候选进行完整确认（见 expressions_equal）。
     """
-    if len(list1) != len(list2):
-        return False
+    return _compare([(LIST, list1, list2, None, None)], memo if memo is not None else {})
 
-    # 对于每个元素进行递归比较
-    list2_copy = list2[:]
-    for item1 in list1:
-        match_found = False
-        for item2 in list2_copy:
-            if expressions_equal(item1, item2):  # 递归比较每一对元素
-                list2_copy.remove(item2)  # 如果找到了匹配项，移除它
-                match_found = True
-                break
-        if not match_found:
-            return False  # 如果某个元素没有匹配项，则返回 False
+class NodeMismatch(Mismatch):
+    """
+    语法树比较中第一处不匹配的节点对：type（节点类型不同）、keys（参数名不同）、chain（运算链的操作数个数不同）、
+    list（列表参数 `context` 无序比较不等）、value（标量参数不等）、error（解析出错，left 为异常）、
+    prefilter（查询摘要的特征 `context` 不同，left / right 为两边的值，见 Prefilter）。
+    """
 
-    return True
+    def message(self, level: str = "full") -> str:
+        left, right = self.left, self.right
+        if self.kind == "error":
+            return f"Error parsing SQL: {left}"
+        if self.kind == "type":
+            if level == "summary":
+                return f"Type mismatch: {type(left).__name__} and {type(right).__name__} are of different types."
+            return f"Type mismatch: {left} and {right} are of different types."
+        if self.kind == "keys":
+            keys1, keys2 = filter_args(left).keys(), filter_args(right).keys()
+            if level == "summary":
+                return f"Match failed: [Keywords] {sorted(keys1 ^ keys2)} of {type(left).__name__} do not match."
+            return f"Match failed: [Keywords] {keys1} and [Keywords] {keys2} do not match."
+        if self.kind == "prefilter":
+            return f"Match failed: [Prefilter] {self.context} {left} and {right} do not match."
+        if self.kind == "chain":
+            if level == "summary":
+                return f"Match failed: [Chain] {type(left).__name__} operands are not equal."
+            return f"Match failed: [Chain] {left} and {right} are not equal."
+        if self.kind == "list":
+            if level == "summary":
+                return f"Match failed: [SubSQLList] {self.context} ({len(left)} and {len(right)} items) are not equal."
+            return f"Match failed: [SubSQLList] {[item.sql(pretty=True) for item in left]} and [SubSQLList] {[item.sql(pretty=True) for item in right]} are not equal."
+        return f"Match failed: [Value] {left} and [Value] {right} are not equal."
 
-def expressions_equal(expr1: Expression, expr2: Expression) -> bool:
+def expressions_equal(expr1: Expression, expr2: Expression, memo: dict = None, trace: list = None) -> bool:
     """
-    递归比较两个 SQL AST 结构是否等价，忽略别名，仅根据结构判断。
+    比较两个 SQL AST 结构是否等价，忽略别名，仅根据结构判断。
+    给出 `trace`（列表）时，在其中记录第一处不匹配的节点对（NodeMismatch），不渲染任何 SQL 文本。
     """
-    if type(expr1) != type(expr2):
+    return _compare([(NODE, expr1, expr2, None, None)], memo if memo is not None else {}, trace)
+
+# 比较栈中的任务类型：节点对、列表参数（无序）、标量参数
+NODE, LIST, VALUE = range(3)
+
+def literal_key(literal: Literal) -> tuple:
+    return tuple(sorted((key, scalar_token(value)) for key, value in filter_args(literal).items()))
+
+def _compare(stack: list, memo: dict, trace: list = None) -> bool:
+    """
+    用显式栈按深度优先顺序比较（与逐层递归比较的顺序相同），耗时与树的大小成线性，不受 Python 递归深度限制：
+    - 节点对：类型和参数名一致后，按参数顺序压入子任务；AND / OR / + 运算链展开为有序的操作数逐一比较；
+    - 列表参数：无序比较。全部为字面量的列表（如 IN (...)、VALUES 中的一行）排序后直接比较；
+      其余按指纹分桶，唯一候选的元素对压入栈中继续比较，同一指纹有多个候选时逐个尝试；
+    - 标量参数：直接比较。
+    栈中的任务为 (类型, 左, 右, 参数名, 所在的最外层列表)：列表内部的不匹配记为该列表不相等，与原递归实现的信息一致。
+    """
+    def fail(mismatch, scope):
+        if trace is not None:
+            trace.append(scope if scope is not None else mismatch)
         return False
 
-    def filter_args(expr):
-        return {k: v for k, v in expr.args.items() if k not in {"alias", "comments", "parent", "arg_key", "index", "recursive"}}
+    while stack:
+        kind, left, right, key, scope = stack.pop()
 
-    args1, args2 = filter_args(expr1), filter_args(expr2)
+        if kind == VALUE:
+            if left != right:
+                return fail(NodeMismatch("value", left, right, key), scope)
+            continue
 
+        if kind == LIST:
+            own = scope if scope is not None else NodeMismatch("list", left, right, key)
+            if len(left) != len(right):
+                return fail(own, scope)
+            if all(type(item) is Literal for item in left) and all(type(item) is Literal for item in right):
+                if sorted(map(literal_key, left)) != sorted(map(literal_key, right)):
+                    return fail(own, scope)
+                continue
 
-    if args1.keys() != args2.keys():
-        return False
+            # 按指纹对 right 分桶
+            buckets = {}
+            for item2 in right:
+                buckets.setdefault(fingerprint(item2, memo), []).append(item2)
+            pairs = []
+            for item1 in left:
+                candidates = buckets.get(fingerprint(item1, memo))
+                if not candidates:
+                    return fail(own, scope)  # 指纹多重集合不一致，直接判定不等
+                if len(candidates) == 1:
+                    pairs.append((item1, candidates.pop()))
+                    continue
+                for i, item2 in enumerate(candidates):
+                    if _compare([(NODE, item1, item2, None, None)], memo):  # 确认指纹碰撞
+                        candidates.pop(i)  # 如果找到了匹配项，移除它
+                        break
+                else:
+                    return fail(own, scope)  # 如果某个元素没有匹配项，则返回 False
+            for item1, item2 in reversed(pairs):
+                stack.append((NODE, item1, item2, None, own))
+            continue
+
+        if left is right:
+            continue
+        if type(left) != type(right):
+            return fail(NodeMismatch("type", left, right), scope)
+
+        if is_chain(left) and is_chain(right):
+            operands1, operands2 = chain_operands(left), chain_operands(right)
+            if len(operands1) != len(operands2):
+                return fail(NodeMismatch("chain", left, right), scope)
+            for operand1, operand2 in reversed(list(zip(operands1, operands2))):
+                stack.append((NODE, operand1, operand2, None, scope))
+            continue
+
+        args1, args2 = filter_args(left), filter_args(right)
+        if args1.keys() != args2.keys():
+            return fail(NodeMismatch("keys", left, right), scope)
+
+        # 只比较结构，不比较别名；逆序压栈，使参数按原顺序比较
+        for arg_key in reversed(list(args1)):
+            val1, val2 = args1[arg_key], args2[arg_key]
+            if isinstance(val1, Expression) and isinstance(val2, Expression):
+                stack.append((NODE, val1, val2, arg_key, scope))
+            elif isinstance(val1, list) and isinstance(val2, list):
+                stack.append((LIST, val1, val2, arg_key, scope))
+            else:
+                stack.append((VALUE, val1, val2, arg_key, scope))
 
-    for key in args1:
-        val1, val2 = args1[key], args2[key]
-
-        # 只比较结构，不比较别名
-        if isinstance(val1, Expression) and isinstance(val2, Expression):
-            if not expressions_equal(val1, val2):
-                return False
-        elif isinstance(val1, list) and isinstance(val2, list):
-            # 在列表比较时，进行无序比较（递归比较每个元素）
-            if not compare_lists_unordered(val1, val2):
-                # print(expr1.sql(pretty=True), " 与 ", expr2.sql(pretty=True), " 比较失败")
-                # print(f"比较失败: {val1} 与 {val2} 不相等")
-                return False
-        else:
-            if val1 != val2:
-                return False
-
-    # print(expr1, " 与 ", expr2, " 相等")
     return True
 
-def is_equi_match(sql1: str, sql2: str, dialect: str = "sqlite") -> bool:
+class EquiComparison:
     """
-    判断两条 SQL 是否等价（基于 AST 解析），自动处理查询1与查询2之间严格的别名映射。
+    compare_sql 的结果：结论、别名替换后的两棵语法树和第一处不匹配的记录。
+    SQL 文本（pretty）和信息（message）只在访问时渲染。
+    """
+
+    __slots__ = ("matched", "expr1", "expr2", "mismatch")
+
+    def __init__(self, matched: bool, expr1=None, expr2=None, mismatch: NodeMismatch = None):
+        self.matched = matched
+        self.expr1 = expr1
+        self.expr2 = expr2
+        self.mismatch = mismatch
+
+    def message(self, level: str = "full"):
+        return None if self.mismatch is None else self.mismatch.message(level)
+
+    def pretty(self) -> tuple:
+        """
+        两棵语法树的 SQL 文本（解析出错时为 (None, None)）。
+        """
+        if self.expr1 is None or self.expr2 is None:
+            return None, None
+        return self.expr1.sql(pretty=True), self.expr2.sql(pretty=True)
+
+def compare_sql(sql1: str, sql2: str, dialect: str = "sqlite", cache: SQLCache = None, prefilter: bool = False) -> EquiComparison:
     """
+    比较两条 SQL 并记录第一处不匹配的位置，不渲染任何文本（见 EquiComparison）。
+    `cache` 为解析缓存，默认为本模块的 sql_cache。
+    `prefilter` 为真时先比较两条 SQL 未优化的查询摘要（表、列数、聚合、窗口函数、集合运算，见 Prefilter），
+    能确定不等价时不再优化和比较，此时 EquiComparison 中为未优化（或已缓存的优化后）的语法树。
+    """
+    cache = cache or sql_cache
     try:
-        expr1 = optimize(parse_one(sql1, dialect=dialect))
-        expr2 = optimize(parse_one(sql2, dialect=dialect))
+        if prefilter:
+            summary1, expr1 = cache.summary(sql1, dialect)
+            summary2, expr2 = cache.summary(sql2, dialect)
+            with measure("prefilter"):
+                reason = reject_reason(summary1, summary2)
+            prefilter_stats.add("equi_checked")
+            if reason is not None:
+                feature, value1, value2 = reason
+                prefilter_stats.add("equi_rejected")
+                prefilter_stats.add(f"equi_{feature}")
+                return EquiComparison(False, expr1, expr2, NodeMismatch("prefilter", value1, value2, feature))
+
+        parsed1 = cache.get(sql1, dialect)
+        parsed2 = cache.get(sql2, dialect)
+        expr1, expr2 = parsed1.expression, parsed2.expression
 
-        alias_map_sql1 = get_alias_map(expr1)
-        alias_map_sql2 = get_alias_map(expr2)
+        alias_map_sql1 = parsed1.alias_map
+        alias_map_sql2 = parsed2.alias_map
 
-        alias_mapping = match_aliases(alias_map_sql1, alias_map_sql2)
-        # print(f"别名映射: {alias_mapping}")
+        memo = {**parsed1.memo, **parsed2.memo}  # 指纹缓存，别名匹配与结构比较共用
+        with measure("alias"):
+            alias_mapping = match_aliases(alias_map_sql1, alias_map_sql2, memo)
+            # print(f"别名映射: {alias_mapping}")
 
-        expr1 = normalize_expression(expr1, alias_mapping)  # 只修改查询1的别名
+            expr1 = normalize_expression(expr1, alias_mapping)  # 只修改查询1的别名
 
-        return expressions_equal(expr1, expr2)
+        trace = []
+        with measure("compare"):
+            matched = expressions_equal(expr1, expr2, memo, trace)
+        return EquiComparison(matched, expr1, expr2, trace[0] if trace else None)
     except Exception as e:
         print(f"解析 SQL 出错: {e}")
-        return False
+        return EquiComparison(False, mismatch=NodeMismatch("error", e))
+
+def is_equi_match(sql1: str, sql2: str, dialect: str = "sqlite", diagnostics: str = "off", prefilter: bool = False):
+    """
+    判断两条 SQL 是否等价（基于 AST 解析），自动处理查询1与查询2之间严格的别名映射。
+
+    :param diagnostics: 诊断级别（见 Diagnostics.LEVELS）：off 返回 bool；summary / full 返回 (bool, 信息)
+    :param prefilter: 优化之前先用查询摘要快速判定不等价（见 compare_sql），结论不变
+    """
+    check_level(diagnostics)
+    comparison = compare_sql(sql1, sql2, dialect, prefilter=prefilter)
+    return report(comparison.mismatch if not comparison.matched else None, diagnostics)
 
 
 # # demo
@@ -1,12 +1,13 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
 import re
+import os
 import json
-def is_equi_match_with_llm(sql1: str, sql2: str, base_url, api_key, model_name, temperature=0.7):
-    client = OpenAI(
-    base_url=base_url,
-    api_key=api_key,
-)
-    prompt = f"""
+import asyncio
+import hashlib
+import threading
+from ScoreDedup import normalize_sql
+
+PROMPT_TEMPLATE = """
 请判断如下两个SQL查询语句是否等价。在判断 SQL 查询语句等价性时，请使用语义等价而非严格语法等价的标准。两个 SQL 查询如果满足以下条件，应视为等价：
 
 1. 核心数据关系相同：相同的表连接和连接条件，无论表别名如何不同
@@ -43,19 +44,233 @@ def is_equi_match_with_llm(sql1: str, sql2: str, base_url, api_key, model_name,
 {sql2}
 ```
     """
-    
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {"role": "system", "content": prompt}
-        ],
-        temperature=0.7,
-        max_tokens=114514,
-    )
-    json_pattern = r"```json([\s\S]*?)```"
-    result = re.search(json_pattern, response.choices[0].message.content).group(1)
-    result_dict = json.loads(result)
-    return result_dict
+
+# 修改提示词时递增，旧提示词下缓存的结论不再使用
+PROMPT_VERSION = "1"
+
+# 回复无法解析时追加的提示，要求模型只重新输出 JSON
+RETRY_PROMPT = """上一次的回复无法解析为要求的 JSON 格式（{error}）。请不要重复分析，直接按如下格式输出结果：
+
+```json
+{{
+   "result": true 或 false,
+   "reason": "判断依据"
+}}
+```"""
+
+def parse_verdict(content: str) -> dict:
+    """
+    从模型回复中提取 {"result": bool, "reason": str}，找不到 JSON 或格式不符时抛出 ValueError。
+    """
+    match = re.search(r"```json([\s\S]*?)```", content)
+    text = match.group(1) if match else None
+    if text is None:
+        match = re.search(r"\{[\s\S]*\}", content)  # 没有代码块时取第一个 {...}
+        if match is None:
+            raise ValueError("no JSON object found")
+        text = match.group(0)
+    result = json.loads(text)
+    if not isinstance(result, dict) or not isinstance(result.get("result"), bool):
+        raise ValueError('"result" must be a boolean')
+    return {"result": result["result"], "reason": str(result.get("reason", ""))}
+
+def verdict_key(sql1: str, sql2: str, model_name: str, prompt_version: str = PROMPT_VERSION) -> str:
+    """
+    结论缓存的键：规范化后的两条 SQL（见 ScoreDedup.normalize_sql）、模型名和提示词版本。
+    """
+    text = json.dumps([normalize_sql(sql1), normalize_sql(sql2), model_name, prompt_version], ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class VerdictCache:
+    """
+    LLM 结论缓存；给出 `path` 时持久化为 JSON Lines 文件，启动时读入，新结论追加写入。
+    只缓存成功解析的结论，请求失败或无法解析的结果下次会重新请求。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = {}
+        self._file = None
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 写到一半的最后一行
+                    self._entries[entry["key"]] = entry["verdict"]
+
+    def get(self, key: str):
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: str, verdict: dict):
+        with self._lock:
+            self._entries[key] = verdict
+            if self.path:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps({"key": key, "verdict": verdict}, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class LLMJudge:
+    """
+    LLM 等价性判断：持有一个 AsyncOpenAI 客户端，在后台事件循环中以有限并发发送请求，
+    结论按 (规范化后的 sql1, sql2, 模型, 提示词版本) 缓存。base_url 可以指向任意 OpenAI 兼容服务（包括本地 mock 服务）。
+
+    :param temperature: 采样温度，判断任务默认 0
+    :param max_tokens: 单次回复的最大 token 数
+    :param concurrency: 同时进行的请求数上限
+    :param cache_path: 结论缓存文件（JSON Lines），为 None 时只在内存中缓存
+    :param parse_retries: 回复无法解析为 JSON 时，带着错误信息追问的次数
+    :param timeout: 单次请求的超时时间（秒）
+    :param max_retries: 连接错误、限流等由 openai 客户端自动重试的次数
+    """
+
+    def __init__(self, base_url, api_key, model_name, temperature=0.0, max_tokens=1024, concurrency=8,
+                 cache_path=None, parse_retries=2, timeout=60, max_retries=2, prompt_version=PROMPT_VERSION):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.concurrency = concurrency
+        self.parse_retries = parse_retries
+        self.prompt_version = prompt_version
+        self.client = AsyncOpenAI(base_url=base_url, api_key=api_key, timeout=timeout, max_retries=max_retries)
+        self.cache = VerdictCache(cache_path)
+        self.stats = {"requests": 0, "cache_hits": 0, "parse_retries": 0, "failures": 0}
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._pending = {}  # 正在请求中的键，相同的判断只发一次请求
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-judge", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    async def _request(self, sql1: str, sql2: str) -> dict:
+        messages = [{"role": "system", "content": PROMPT_TEMPLATE.format(sql1=sql1, sql2=sql2)}]
+        error = None
+        for attempt in range(self.parse_retries + 1):
+            if attempt:
+                self.stats["parse_retries"] += 1
+            self.stats["requests"] += 1
+            try:
+                response = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                )
+            except Exception as e:
+                self.stats["failures"] += 1
+                return {"result": None, "reason": f"LLM request failed: {e}"}
+            content = response.choices[0].message.content or ""
+            try:
+                return parse_verdict(content)
+            except ValueError as e:
+                error = e
+                messages = messages + [
+                    {"role": "assistant", "content": content},
+                    {"role": "user", "content": RETRY_PROMPT.format(error=e)},
+                ]
+        self.stats["failures"] += 1
+        return {"result": None, "reason": f"Unparseable LLM response: {error}"}
+
+    async def ajudge(self, sql1: str, sql2: str) -> dict:
+        """
+        协程版本，需在本对象的事件循环中运行（通过 judge / judge_many 调用）。
+        返回 {"result": bool 或 None（请求失败/无法解析）, "reason": str, "cached": bool}。
+        """
+        key = verdict_key(sql1, sql2, self.model_name, self.prompt_version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return {**cached, "cached": True}
+
+        task = self._pending.get(key)
+        if task is None:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def run():
+                async with self._semaphore:
+                    verdict = await self._request(sql1, sql2)
+                if verdict["result"] is not None:
+                    self.cache.put(key, verdict)
+                return verdict
+
+            task = asyncio.ensure_future(run())
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        verdict = await task
+        return {**verdict, "cached": False}
+
+    def judge(self, sql1: str, sql2: str) -> dict:
+        """
+        判断一对 SQL，可以在多个线程中同时调用（共用同一个客户端和并发上限）。
+        """
+        return asyncio.run_coroutine_threadsafe(self.ajudge(sql1, sql2), self._ensure_loop()).result()
+
+    __call__ = judge
+
+    def judge_many(self, pairs) -> list:
+        """
+        并发判断多对 SQL，返回顺序与输入一致。
+        """
+        async def run_all():
+            return await asyncio.gather(*(self.ajudge(sql1, sql2) for sql1, sql2 in pairs))
+        return asyncio.run_coroutine_threadsafe(run_all(), self._ensure_loop()).result()
+
+    def close(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+            self._semaphore = None  # 绑定在旧的事件循环上
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.client.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_judges = {}
+_judges_lock = threading.Lock()
+
+def is_equi_match_with_llm(sql1: str, sql2: str, base_url, api_key, model_name, temperature=0.7):
+    """
+    兼容原接口：相同的服务地址、模型和温度共用一个 LLMJudge（只创建一次客户端）。
+    返回 {"result": bool, "reason": str}；请求失败或回复无法解析时 result 为 None。
+    """
+    key = (base_url, api_key, model_name, temperature)
+    with _judges_lock:
+        judge = _judges.get(key)
+        if judge is None:
+            judge = LLMJudge(base_url, api_key, model_name, temperature=temperature)
+            _judges[key] = judge
+    verdict = judge(sql1, sql2)
+    return {"result": verdict["result"], "reason": verdict["reason"]}
 
 # sql1 = """
 # SELECT a.name, b.order_date 
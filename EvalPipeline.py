@@ -0,0 +1,143 @@
+import time
+import queue
+import threading
+
+# 通知工作线程退出的哨兵
+_DONE = object()
+# 阻塞在队列或名额上的线程检查停止信号的间隔（秒）
+_POLL = 0.1
+
+def _put(q, item, stop) -> bool:
+    """
+    放入队列；队列已满时等待，期间收到停止信号则放弃并返回 False。
+    """
+    while True:
+        try:
+            q.put(item, timeout=_POLL)
+            return True
+        except queue.Full:
+            if stop.is_set():
+                return False
+
+def _get(q, stop):
+    """
+    从队列取出一项；收到停止信号时返回 _DONE。
+    """
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL)
+        except queue.Empty:
+            pass
+    return _DONE
+
+def _stage_worker(fn, in_queue, out_queue, errors, stop):
+    while True:
+        task = _get(in_queue, stop)
+        if task is _DONE:
+            _put(in_queue, _DONE, stop)  # 让同一阶段的其他线程也能看到
+            return
+        index, row, skip = task
+        if not skip:
+            try:
+                row = fn(row)
+            except Exception as e:
+                errors[index] = e
+                skip = True  # 后续阶段跳过该行
+        if not _put(out_queue, (index, row, skip), stop):
+            return
+
+def _start_pipeline(tasks, stages, queue_size, slots, stop):
+    """
+    启动各阶段的工作线程和输入线程，返回 (完成队列, 线程列表, 各阶段队列, 异常表)。
+    `tasks` 为 (row, skip) 的迭代器；输入读完后向完成队列放入 (None, _DONE, 行数)。
+    每读入一行先占用一个名额（`slots`），由调用方在产出该行后释放；`stop` 被设置后所有线程尽快退出。
+    """
+    errors = {}
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    queues.append(queue.Queue())  # 收集完成的行
+
+    threads = []
+    for i, (name, fn, workers) in enumerate(stages):
+        for n in range(max(1, workers)):
+            thread = threading.Thread(target=_stage_worker, args=(fn, queues[i], queues[i + 1], errors, stop),
+                                      name=f"{name}-{n}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    def feed():
+        total = 0
+        try:
+            for row, skip in tasks:
+                while not slots.acquire(timeout=_POLL):
+                    if stop.is_set():
+                        return
+                if not _put(queues[0], (total, row, skip), stop):
+                    return
+                total += 1
+        except Exception as e:
+            errors[-1] = e  # 读取输入出错，已读入的行照常处理完
+        queues[-1].put((None, _DONE, total))
+
+    feeder = threading.Thread(target=feed, name="feeder", daemon=True)
+    feeder.start()
+    threads.append(feeder)
+    return queues[-1], threads, queues[:-1], errors
+
+def iter_pipeline(rows, stages, queue_size=64, max_in_flight=None, skip=None):
+    """
+    分阶段流水线：每个阶段有独立的线程数，阶段之间用有界队列连接，
+    一行完成上一阶段后立即进入下一阶段，各阶段并行重叠执行。
+    `rows` 可以是任意迭代器（在输入线程中边读边处理），按输入顺序逐行产出处理后的行。
+    已读入但尚未产出的行数不超过 `max_in_flight`（默认 queue_size * (阶段数 + 1)），内存占用与输入长度无关。
+
+    :param rows: 输入行（通常是 dict）
+    :param stages: [(阶段名, fn, 线程数), ...]，fn 接收一行并返回处理后的行
+    :param queue_size: 阶段之间队列的容量，限制在途的行数
+    :param skip: 可选的判断函数 skip(row)，为真的行不经过任何阶段、原样按顺序产出（如从检查点恢复的行）
+    阶段抛出异常的行不会产出，所有行处理完后重新抛出第一个异常。
+    调用方提前结束迭代（break 或异常）时，通知各线程停止并等待它们退出。
+    """
+    if max_in_flight is None:
+        max_in_flight = queue_size * (len(stages) + 1)
+    slots = threading.Semaphore(max_in_flight)
+    stop = threading.Event()
+    tasks = ((row, skip is not None and bool(skip(row))) for row in rows)
+    done_queue, threads, queues, errors = _start_pipeline(tasks, stages, queue_size, slots, stop)
+
+    buffered = {}  # 已完成、等待前面的行完成后再按顺序产出
+    next_index = 0
+    total = None
+    try:
+        while total is None or next_index < total:
+            index, row, skip_row = done_queue.get()
+            if row is _DONE:
+                total = skip_row
+                continue
+            buffered[index] = row
+            while next_index in buffered:
+                row = buffered.pop(next_index)
+                slots.release()
+                if next_index not in errors:
+                    yield row
+                next_index += 1
+    finally:
+        # 正常结束时各阶段队列已空，_DONE 依次传给每个线程；提前结束时由停止信号中断阻塞的线程
+        if total is None or next_index < total:
+            stop.set()
+        for q in queues:
+            _put(q, _DONE, stop)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[min(errors)]
+
+def timed(name, fn):
+    """
+    包装阶段函数，把该阶段的耗时（秒）记录到行的 f"{name}_seconds" 字段。
+    """
+    def stage(row):
+        start = time.perf_counter()
+        row = fn(row)
+        row[f"{name}_seconds"] = time.perf_counter() - start
+        return row
+    return stage
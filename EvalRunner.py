@@ -0,0 +1,223 @@
+import os
+import pandas as pd
+from collections import namedtuple
+from GoldPack import build_gold_pack, db_stamp
+from SQLitePool import get_pool, close_pool, format_load_stats
+from PredictFetcher import make_session, fetch_prediction
+from EvalPipeline import iter_pipeline, timed
+from Checkpoint import Checkpoint, config_hash, row_key
+from DatasetIO import read_dataset, ResultWriter
+from ScoreDedup import normalize_sql, ScoreCache
+from Instrument import COLUMNS as METRICS, recording, fill_columns, StageStats, SlowestRows, profile_rows
+from Prefilter import prefilter_stats, format_stats
+
+# 评测器之间不同的部分（evalText2SQL / evalText2SQL_with_Err）：
+# name         评测器名称，用于去重键和检查点配置
+# pred_column  预测SQL所在的列
+# columns      equi / exec 写入的结果列
+# sql_cache    等价性匹配使用的解析缓存（gold pack 预加载到这里）
+# equi         equi(gold_sql, pred_sql, prefilter) -> {列: 值}
+# exec         exec(pred_sql, gold_sql, prefilter, **执行参数) -> {列: 值}
+# fetch_error  生成接口没有返回 SQL 时写入预测列的文本 fetch_error(response)
+# options      影响结果的其他参数（如 diagnostics），与 prefilter / dedup 等公共参数一起计入检查点配置
+# messages     结果中的信息列：信息可能包含原始 SQL 文本（如执行错误、解析错误的位置），去重时不跨不同的原始文本复用
+Matchers = namedtuple("Matchers", ["name", "pred_column", "columns", "sql_cache", "equi", "exec", "fetch_error", "options", "messages"])
+
+def run_evaluation(matchers: Matchers, dataset_path, db_path, db_load=None, **options):
+    """
+    获取数据集中每个问题的预测SQL，用 `matchers` 计算 Equi-Match 与 Exec-Match 分数。
+    参数含义见 evalText2SQL.evalText2SQL。结束后关闭本轮评测使用的连接池（各线程的连接和预加载的数据库）。
+
+    :return: (dataset, equi_match_score, exec_match_score)
+    """
+    try:
+        return _evaluate(matchers, dataset_path, db_path, db_load=db_load, **options)
+    finally:
+        close_pool(db_path)
+        if db_load:
+            close_pool(db_path, load=db_load)
+
+def _evaluate(matchers: Matchers, dataset_path, db_path, ignore_extra_columns=False, gold_pack_path=None, db_load=None,
+              exec_options=None, api_url=None, fetch_options=None, workers=None, checkpoint_path=None, output_path=None,
+              chunk_size=1000, dedup=True, instrument=False, profile_slowest=0, profile_path=None, prefilter=False):
+    pred_column = matchers.pred_column
+    sql_cache = matchers.sql_cache
+    streaming = output_path is not None
+    if streaming:
+        records = read_dataset(dataset_path, chunk_size)
+        gold_sqls = (record['gold_sql'] for record in read_dataset(dataset_path, chunk_size))
+    else:
+        dataset = pd.read_csv(dataset_path)
+        records = ({'query': query, 'gold_sql': gold_sql} for query, gold_sql in zip(dataset['query'], dataset['gold_sql']))
+        gold_sqls = dataset['gold_sql']
+    # db_load="memory"/"mmap"：整轮评测前把数据库加载到内存（见 SQLitePool.ConnectionPool）；
+    # memory 为每个执行线程复制一份数据库，数据库较大、执行线程较多时用 mmap 共享一份
+    exec_db = get_pool(db_path, load=db_load) if db_load else db_path
+    # 传给 is_exec_match 的其他参数，如 timeout / max_steps / streaming / verify
+    exec_options = exec_options or {}
+    # gold pack：预先计算的真实SQL语法树与结果签名，只在真实SQL或数据库变化时重新计算
+    gold_pack = None
+    if gold_pack_path:
+        gold_pack = build_gold_pack(gold_sqls, db_path, gold_pack_path, timeout=exec_options.get('timeout'),
+                                    max_steps=exec_options.get('max_steps'))
+        gold_pack.install(sql_cache)
+    # 流水线：获取预测 -> 等价性匹配 -> 执行匹配，各阶段独立并发，每行拿到预测后立即评分
+    # workers: 各阶段线程数；fetch_options: timeout / retries / backoff，见 PredictFetcher.fetch_prediction
+    workers = {'fetch': 8, 'equi': 1, 'exec': 4, **(workers or {})}
+    fetch_options = fetch_options or {}
+    session = make_session(workers['fetch'])
+
+    def fetch(row):
+        response = fetch_prediction(session, api_url, row['query'], **fetch_options)
+        print(response)
+        if response['type'] == 'sql':
+            row[pred_column] = response['text']
+        else:
+            row[pred_column] = matchers.fetch_error(response)
+        return row
+
+    # 去重：本次评测中相同的 (真实SQL, 预测SQL) 只评分一次（数据库和参数在一次评测内不变）
+    score_cache = ScoreCache()
+    def scored(kind, row, compute):
+        if not dedup:
+            return compute()
+        # 执行匹配按原始文本中是否有 "ORDER BY" 决定是否比较行序，规范化会把 "ORDER  BY" 合并为 "ORDER BY"，因此计入键
+        ordered = isinstance(row['gold_sql'], str) and "ORDER BY" in row['gold_sql'].upper()
+        key = (kind, normalize_sql(row['gold_sql']), normalize_sql(row[pred_column]), ordered)
+        sqls = (row['gold_sql'], row[pred_column])
+        (result, source), row[f'{kind}_reused'] = score_cache.get_or_compute(key, lambda: (compute(), sqls))
+        if source != sqls and any(result.get(column) is not None for column in matchers.messages):
+            # 信息来自原始文本不同的另一行，为当前行重新评分
+            row[f'{kind}_reused'] = False
+            return compute()
+        return result
+
+    def score_equi(row):
+        return matchers.equi(row['gold_sql'], row[pred_column], prefilter)
+
+    def score_exec(row):
+        gold_signatures = gold_pack.exec_signatures(row['gold_sql']) if gold_pack else None
+        return matchers.exec(row[pred_column], row['gold_sql'], prefilter, db_path=exec_db, ignore_extra_columns=ignore_extra_columns,
+                             gold_signatures=gold_signatures, **exec_options)
+
+    def equi(row):
+        row.update(scored('equi', row, lambda: score_equi(row)))
+        return row
+
+    def execute(row):
+        row.update(scored('exec', row, lambda: score_exec(row)))
+        return row
+
+    def instrumented(stage):
+        # 在阶段线程上把细分耗时和结果大小记录到当前行
+        def run(row):
+            with recording(row):
+                return stage(row)
+        return run if instrument else stage
+
+    columns = [pred_column] + matchers.columns
+    timings = ['fetch_seconds', 'equi_seconds', 'exec_seconds']
+    if instrument:
+        # 细分阶段耗时与结果大小（包含 timings）作为结果的额外列
+        timings = METRICS
+        columns = columns + timings
+    rows = ({**record, 'key': row_key(i, record['query'], record['gold_sql'])} for i, record in enumerate(records))
+
+    # 检查点：每行完成后追加到 checkpoint_path，重新运行时跳过数据集、数据库和评测参数都相同的已完成行
+    checkpoint = None
+    finished = {}
+    if checkpoint_path:
+        config = config_hash(evaluator=matchers.name, dataset=os.path.abspath(dataset_path), db=db_stamp(db_path),
+                             ignore_extra_columns=ignore_extra_columns, exec_options=exec_options, api_url=api_url,
+                             prefilter=prefilter, dedup=dedup, **matchers.options)
+        checkpoint = Checkpoint(checkpoint_path, config)
+        finished = checkpoint.load()
+        if finished:
+            print(f"Resuming from checkpoint: {len(finished)} rows already scored")
+
+    writer = ResultWriter(output_path, chunk_size) if streaming else None
+    results = []
+    # 分数的累计值（包括从检查点恢复的行）
+    total = 0
+    matched = {'equi': 0, 'exec': 0}
+    # 本次实际评分的行数，以及其中复用去重结果的行数
+    reused = {'rows': 0, 'equi': 0, 'exec': 0}
+    # 本次实际评分的行的耗时统计，以及耗时最长的行（用于 profile_slowest）
+    stage_stats = StageStats() if instrument else None
+    # 本次评测中快速判定的计数
+    prefilter_start = prefilter_stats.snapshot()
+    slowest = SlowestRows(profile_slowest)
+    try:
+        for row in iter_pipeline(rows, [
+            ('fetch', timed('fetch', fetch), workers['fetch']),
+            ('equi', timed('equi', instrumented(equi)), workers['equi']),
+            ('exec', timed('exec', instrumented(execute)), workers['exec']),
+        ], skip=lambda row: row['key'] in finished):
+            key = row.pop('key')
+            if key in finished:
+                # 只恢复本次输出的列（检查点可能由开启 instrument 的评测写入）
+                row.update({column: value for column, value in finished[key].items() if column in columns + timings})
+            else:
+                if instrument:
+                    stage_stats.add(row)
+                slowest.add(row)
+                reused['rows'] += 1
+                reused['equi'] += bool(row.pop('equi_reused', False))
+                reused['exec'] += bool(row.pop('exec_reused', False))
+            if instrument:
+                fill_columns(row)  # 未执行的阶段（如复用去重结果、从检查点恢复的行）记为 0
+            if key not in finished and checkpoint is not None:
+                checkpoint.append(key, {column: row[column] for column in columns + timings})
+            total += 1
+            matched['equi'] += bool(row['equi_match'])
+            matched['exec'] += bool(row['exec_match'])
+            if key not in finished:
+                progress = f"{total}" if streaming else f"{total}/{len(dataset)}"
+                print(f"[{progress}] Equi-Match: {matched['equi'] / total:.4f}  Exec-Match: {matched['exec'] / total:.4f}")
+            if streaming:
+                writer.write({column: value for column, value in row.items() if instrument or column not in timings})
+            else:
+                results.append(row)
+    finally:
+        session.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        if writer is not None:
+            writer.close()
+
+    if not streaming:
+        for column in columns:
+            dataset[column] = [result[column] for result in results]
+    else:
+        dataset = None
+
+    # 分数
+    equi_match_score = matched['equi'] / total
+    exec_match_score = matched['exec'] / total
+    print(f'Equi-Match: {equi_match_score}')
+    print(f'Exec-Match: {exec_match_score}')
+    if dedup and reused['rows']:
+        for kind, name in [('equi', 'Equi-Match'), ('exec', 'Exec-Match')]:
+            unique = reused['rows'] - reused[kind]
+            print(f"Dedup {name}: {unique}/{reused['rows']} unique, {reused[kind] / reused['rows']:.2%} reused")
+    if prefilter:
+        counts = format_stats(prefilter_stats.since(prefilter_start))
+        if counts:
+            print(counts)
+    if db_load:
+        print(format_load_stats(exec_db.load_stats))
+    if instrument:
+        print(f"Stage timings:\n{stage_stats.format()}")
+    if slowest.rows:
+        # 清空解析缓存（保留 gold pack 预加载的真实SQL），重现这些行首次评分时的开销
+        sql_cache.clear()
+        if gold_pack is not None:
+            gold_pack.install(sql_cache)
+
+        def rescore(row):
+            score_equi(row)
+            score_exec(row)
+
+        print(f"Profile of the {len(slowest.rows)} slowest rows:")
+        print(profile_rows([row for _, row in slowest.rows], rescore, profile_path=profile_path))
+    return dataset, equi_match_score, exec_match_score
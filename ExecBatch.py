@@ -0,0 +1,100 @@
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from SQLitePool import ConnectionPool, get_pool
+from ExecMatch_with_Err import (execute_sql, execute_digest, compare_exec_results, compare_digests,
+                                verify_digests, signature_digest)
+
+def estimate_cost(pred_sql: str, gold_sql: str, gold_signatures: dict = None) -> float:
+    """
+    估计一行的执行耗时（秒），用于调度排序：优先使用 gold pack 中记录的真实SQL执行耗时，
+    否则按两条 SQL 中 SELECT / JOIN 的数量粗略估计。
+    """
+    if gold_signatures and gold_signatures.get("seconds") is not None:
+        return gold_signatures["seconds"]
+    return 1e-3 * len(re.findall(r"\b(?:SELECT|JOIN)\b", f"{pred_sql}\n{gold_sql}", re.IGNORECASE))
+
+def batch_exec_match(pairs, db_path, ignore_extra_columns=False, gold_signatures=None, costs=None, workers=4,
+                     timeout=None, max_steps=None, streaming=False, verify=False, rtol=None, atol=None) -> list:
+    """
+    批量执行匹配：预测SQL和真实SQL作为独立任务提交到线程池，每个线程使用自己的只读连接。
+    SQLite 执行查询时释放 GIL，同一行的两条查询、不同行的查询可以并行执行；
+    结果比较在调用线程中按提交顺序进行，与其余查询的执行重叠；同时执行的查询数有上限，比较完的结果随即释放。
+    任务按估计耗时从长到短提交，避免慢查询落在最后拖长整批的耗时。
+
+    :param pairs: [(pred_sql, gold_sql), ...]
+    :param db_path: SQLite数据库路径，或 SQLitePool.ConnectionPool
+    :param gold_signatures: 与 pairs 对齐的真实SQL结果签名列表（GoldPack.exec_signatures，可含 None），提供时不再执行真实SQL
+    :param costs: 与 pairs 对齐的估计耗时（如上一轮评测记录的耗时），默认用 estimate_cost 估计
+    :param workers: 执行查询的线程数
+    其余参数同 ExecMatch_with_Err.is_exec_match。
+    :return: 与输入顺序一致的 [(是否一致, 信息), ...]
+    """
+    pairs = list(pairs)
+    if gold_signatures is None:
+        gold_signatures = [None] * len(pairs)
+    if costs is None:
+        costs = [estimate_cost(pred_sql, gold_sql, signatures)
+                 for (pred_sql, gold_sql), signatures in zip(pairs, gold_signatures)]
+    pool = db_path if isinstance(db_path, ConnectionPool) else get_pool(db_path)
+
+    def run(fn, sql_query, *args):
+        return fn(sql_query, pool.connection(), *args)
+
+    # 容差比较需要真实结果的逐列数据，不使用流式摘要和预先计算的签名（与 is_exec_match 一致）
+    typed = rtol is not None or atol is not None
+    use_streaming = streaming and not ignore_extra_columns and not typed
+    schedule = sorted(range(len(pairs)), key=lambda i: costs[i], reverse=True)
+
+    def submit(i):
+        pred_sql, gold_sql = pairs[i]
+        signatures = gold_signatures[i] or {}
+        if use_streaming:
+            ordered = "ORDER BY" in gold_sql.upper()
+            gold_signature = signatures.get("stream")
+            pred_future = executor.submit(run, execute_digest, pred_sql, ordered, timeout, max_steps)
+            gold_future = None if gold_signature is not None else \
+                executor.submit(run, execute_digest, gold_sql, ordered, timeout, max_steps)
+        else:
+            gold_signature = None if typed else signatures.get("ExecMatch_with_Err")
+            pred_future = executor.submit(run, execute_sql, pred_sql, timeout, max_steps)
+            gold_future = None if gold_signature is not None else \
+                executor.submit(run, execute_sql, gold_sql, timeout, max_steps)
+        return i, pred_future, gold_future, gold_signature
+
+    def compare(i, pred_future, gold_future, gold_signature):
+        pred_sql, gold_sql = pairs[i]
+        if use_streaming:
+            gold_digest = gold_future.result() if gold_future is not None else signature_digest(gold_signature)
+            matched, msg = compare_digests(pred_future.result(), gold_digest)
+            if matched and verify:
+                ordered = "ORDER BY" in gold_sql.upper()
+                matched, msg = verify_digests(pred_sql, gold_sql, pool.connection(), ordered, timeout, max_steps)
+            return matched, msg
+        gold_result = gold_future.result() if gold_future is not None else None
+        matched, msg = compare_exec_results(pred_future.result(), gold_result, gold_sql, ignore_extra_columns, gold_signature, rtol, atol)
+        if matched and verify and gold_signature is not None:
+            # 签名一致后执行真实SQL按原始数据比较，排除摘要碰撞（与 is_exec_match 一致）
+            gold_result = execute_sql(gold_sql, pool.connection(), timeout, max_steps)
+            matched, msg = compare_exec_results(pred_future.result(), gold_result, gold_sql, ignore_extra_columns, None, rtol, atol)
+        return matched, msg
+
+    results = [None] * len(pairs)
+    # 同时在执行中的查询不超过 2 * workers 条：比较完一行、释放其结果后再提交后续的行，
+    # 内存占用取决于 workers 而不是整批的大小
+    window = 2 * workers
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        in_flight = 0
+        for i in schedule:
+            task = submit(i)
+            pending.append(task)
+            in_flight += 1 if task[2] is None else 2
+            while in_flight >= window:
+                task = pending.popleft()
+                in_flight -= 1 if task[2] is None else 2
+                results[task[0]] = compare(*task)
+        while pending:
+            task = pending.popleft()
+            results[task[0]] = compare(*task)
+    return results
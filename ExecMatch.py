@@ -1,39 +1,344 @@
 import sqlite3
-import pandas as pd
+import numpy as np
+from ColumnCompare import compare_columns_typed, match_columns_close
+from SQLitePool import get_connection, query_budget, QueryTimeout, read_sql_frame, result_width
+from Instrument import measure
+from Diagnostics import Mismatch, check_level, report
+from Prefilter import prefilter_stats
+from ResultDigest import value_token, stream_digest, aggregate_digest, DigestUnavailable, exact_summary, column_set_signature, set_digest, sequence_digest, multiset_digest, digest_set_of
 
-def execute_sql(sql_query, connection):
+# 比较规则（GoldPack 中的结果签名按规则名分别保存）：
+# "ExecMatch"          无 ORDER BY 时每列各自排序后比较（忽略行顺序）；宽松模式下一个真实列可以匹配多个预测列
+# "ExecMatch_with_Err" 无 ORDER BY 时 None 视为空字符串，各列整体比较（只忽略列顺序）；宽松模式下每个真实列最多匹配一次
+RULES = ("ExecMatch", "ExecMatch_with_Err")
+
+class ResultMismatch(Mismatch):
+    """
+    执行匹配中的不一致：timeout / pred_error / gold_error（left 为异常，context 为超时的一方）、
+    missing_columns / column_count / values / verify（结果不一致）。
+    """
+
+    MESSAGES = {
+        "missing_columns": "Predicted SQL query does not contain the required columns.",
+        "column_count": "The number of columns in the predicted and gold queries do not match.",
+        "values": "The predicted SQL query is incorrect.",
+        "verify": "The predicted SQL query is incorrect (exact verification failed).",
+    }
+
+    def message(self, level: str = "full") -> str:
+        if self.kind == "timeout":
+            return f"Timeout: {self.context} SQL query {self.left}"
+        if self.kind in ("pred_error", "gold_error"):
+            error = self.left
+            # summary 只保留底层的数据库错误，不重复整条 SQL
+            if level == "summary" and error.__cause__ is not None:
+                error = error.__cause__
+            prefix = "Error executing SQL query" if self.kind == "pred_error" else "Gold SQL design error"
+            return f"{prefix}: {error}"
+        return self.MESSAGES[self.kind]
+
+def execute_sql(sql_query, connection, timeout=None, max_steps=None):
+    """
+    执行SQL查询并返回结果，可限制执行时间（秒）或虚拟机步数；出错时返回异常，超出预算时返回 QueryTimeout。
+    """
+    try:
+        with query_budget(connection, timeout, max_steps):
+            return read_sql_frame(sql_query, connection)
+    except Exception as e:
+        return e
+
+def execution_mismatch(pred_result, gold_result) -> ResultMismatch:
+    """
+    任一方执行失败（结果为异常）时返回对应的不一致记录，超时单独报告；都成功时返回 None。
+    """
+    if isinstance(pred_result, QueryTimeout):
+        return ResultMismatch("timeout", pred_result, context="predicted")
+    if isinstance(gold_result, QueryTimeout):
+        return ResultMismatch("timeout", gold_result, context="gold")
+    if isinstance(pred_result, Exception):
+        return ResultMismatch("pred_error", pred_result)
+    if isinstance(gold_result, Exception):
+        return ResultMismatch("gold_error", gold_result)
+    return None
+
+def _column_keys(values, gold_sql, rules: str = "ExecMatch") -> list:
+    ignore_order = "ORDER BY" not in gold_sql.upper()
+    if rules == "ExecMatch_with_Err":
+        # 与 unordered_columns 相同：对整个结果替换 None（全为数值列时整体转换为字符串）
+        values_keyed = np.where(values == None, "", values) if ignore_order else values
+        return [sequence_digest(values_keyed[:, i]) for i in range(values.shape[1])]
+    column_key = multiset_digest if ignore_order else sequence_digest
+    return [column_key(values[:, i]) for i in range(values.shape[1])]
+
+def get_result_signature(result, gold_sql, rules: str = "ExecMatch") -> dict:
+    """
+    计算查询结果的摘要签名，比较规则与 is_exec_match 一致：
+    column_sets 对应宽松模式下的列值集合，column_keys 对应逐列比较时的列数据（规则见 RULES）。
+    结果中有 NaN 时签名与逐列比较不一致（见 ResultDigest.contains_nan），GoldPack 不为这样的结果保存签名。
+    签名由 64 位摘要组成，不保留原始数据：两份不同的结果摘要碰撞时，match_signatures 会判为一致（见 is_exec_match 的 verify）。
+    """
+    values = result.values
+    return {
+        "column_sets": [set_digest(values[:, i]) for i in range(values.shape[1])],
+        "column_keys": _column_keys(values, gold_sql, rules),
+    }
+
+def _match_signatures(pred_result, gold_signature: dict, gold_sql, ignore_extra_columns=False, rules: str = "ExecMatch"):
+    if ignore_extra_columns:
+        pred_sets = [set_digest(pred_result.iloc[:, i]) for i in range(pred_result.shape[1])]
+        if rules == "ExecMatch_with_Err":
+            # 每个真实列最多匹配一次
+            common_columns = []
+            temp_gold_column_sets = list(gold_signature["column_sets"])
+            for i, col_set in enumerate(pred_sets):
+                if col_set in temp_gold_column_sets:
+                    common_columns.append(i)
+                    temp_gold_column_sets.remove(col_set)
+        else:
+            gold_sets = set(gold_signature["column_sets"])
+            common_columns = [i for i, col_set in enumerate(pred_sets) if col_set in gold_sets]
+        if not common_columns:
+            return ResultMismatch("missing_columns")
+        # 与逐列比较一致，在筛选后的结果上计算列数据（列类型合并后的表示可能不同）
+        pred_result = pred_result.iloc[:, common_columns]
+    pred_keys = _column_keys(pred_result.values, gold_sql, rules)
+
+    if len(pred_keys) != len(gold_signature["column_keys"]):
+        return ResultMismatch("column_count")
+    if digest_set_of(pred_keys) != digest_set_of(gold_signature["column_keys"]):
+        return ResultMismatch("values")
+    return None
+
+def match_signatures(pred_result, gold_signature: dict, gold_sql, ignore_extra_columns=False, rules: str = "ExecMatch", diagnostics: str = "off"):
+    """
+    用真实结果的摘要签名（get_result_signature）比较预测结果，无需真实结果的原始数据。返回值见 Diagnostics.report。
     """
-    执行SQL查询并返回结果。
+    return report(_match_signatures(pred_result, gold_signature, gold_sql, ignore_extra_columns, rules), diagnostics)
+
+def execute_digest(sql_query, connection, ordered=False, timeout=None, max_steps=None, exact=False):
+    """
+    计算结果摘要（exact=True 时返回精确表示），不经过 pandas。
+    行序无关时优先在 SQLite 内聚合（见 ResultDigest.aggregate_digest），否则逐行读取游标；出错时返回异常。
     """
+    if not ordered and not exact:
+        # 行序无关时用 SQLite 聚合函数计算摘要，不经过游标取结果；只在无法用聚合函数计算时退回逐行读取，
+        # 查询本身出错或超时直接返回，不再执行第二次
+        try:
+            with query_budget(connection, timeout, max_steps):
+                return aggregate_digest(connection, sql_query)
+        except DigestUnavailable:
+            pass
+        except Exception as e:
+            return e
+
     try:
-        return pd.read_sql_query(sql_query, connection)
+        with query_budget(connection, timeout, max_steps):
+            cursor = connection.execute(sql_query)
+            try:
+                return exact_summary(cursor, ordered) if exact else stream_digest(cursor, ordered)
+            finally:
+                cursor.close()
     except Exception as e:
-        print(f"Error executing SQL query: {e}")
+        return e
+
+def _compare_digests(pred_digest, gold_digest):
+    mismatch = execution_mismatch(pred_digest, gold_digest)
+    if mismatch is not None:
+        return mismatch
+    if pred_digest["column_count"] != gold_digest["column_count"]:
+        return ResultMismatch("column_count")
+    if pred_digest != gold_digest:
+        return ResultMismatch("values")
+    return None
+
+def compare_digests(pred_digest, gold_digest, diagnostics: str = "off"):
+    """
+    比较 execute_digest 得到的两个摘要（或执行时的异常）。返回值见 Diagnostics.report。
+    """
+    return report(_compare_digests(pred_digest, gold_digest), diagnostics)
+
+def _verify_digests(pred_sql, gold_sql, connection, ordered, timeout=None, max_steps=None):
+    pred_exact = execute_digest(pred_sql, connection, ordered, timeout, max_steps, exact=True)
+    gold_exact = execute_digest(gold_sql, connection, ordered, timeout, max_steps, exact=True)
+    if isinstance(pred_exact, Exception) or isinstance(gold_exact, Exception) or pred_exact != gold_exact:
+        return ResultMismatch("verify")
+    return None
+
+def verify_digests(pred_sql, gold_sql, connection, ordered, timeout=None, max_steps=None, diagnostics: str = "off"):
+    """
+    摘要相等后的精确校验，排除哈希碰撞。返回值见 Diagnostics.report。
+    """
+    return report(_verify_digests(pred_sql, gold_sql, connection, ordered, timeout, max_steps), diagnostics)
+
+def signature_error(gold_signature: dict) -> Exception:
+    """
+    预先计算时真实SQL的执行错误（签名中的 "error"，以及底层数据库错误 "cause"），还原为信息与实际执行时相同的异常。
+    """
+    error = Exception(gold_signature["error"])
+    if gold_signature.get("cause") is not None:
+        error.__cause__ = Exception(gold_signature["cause"])
+    return error
+
+def signature_digest(gold_signature: dict):
+    """
+    预先计算的 "stream" 签名；真实SQL预计算时出错则转换为异常。
+    """
+    if gold_signature.get("error"):
+        return signature_error(gold_signature)
+    return gold_signature
+
+def match_streaming(pred_sql, gold_sql, connection, gold_signature=None, verify=False, timeout=None, max_steps=None, diagnostics: str = "off"):
+    """
+    流式比较：两边结果逐行折叠为多重集合摘要（保留重复行，忽略列顺序；真实SQL带 ORDER BY 时比较行序），
+    内存占用与结果大小无关。verify=True 时在摘要相等后再做一次精确比较，排除哈希碰撞。
+    """
+    ordered = "ORDER BY" in gold_sql.upper()
+    with measure("sqlite"):  # 流式比较时执行与摘要计算同时进行
+        pred_digest = execute_digest(pred_sql, connection, ordered, timeout, max_steps)
+        if gold_signature is None:
+            gold_digest = execute_digest(gold_sql, connection, ordered, timeout, max_steps)
+        else:
+            gold_digest = signature_digest(gold_signature)
+
+    with measure("exec_compare"):
+        mismatch = _compare_digests(pred_digest, gold_digest)
+    if mismatch is None and verify:
+        with measure("sqlite"):
+            mismatch = _verify_digests(pred_sql, gold_sql, connection, ordered, timeout, max_steps)
+    return report(mismatch, diagnostics)
+
+def prefilter_columns(pred_result, gold_sql, connection, timeout=None, max_steps=None) -> ResultMismatch:
+    """
+    执行真实SQL之前的快速判定：预测结果的列数与真实SQL结果的列数（不取数据，见 SQLitePool.result_width）不同时
+    直接判定列数不一致，省去真实SQL的执行。无法获取列数时返回 None，照常执行。
+    真实SQL本身执行出错或超时的情况下，信息为列数不一致而不是真实SQL的错误（结论相同）。
+    """
+    prefilter_stats.add("exec_checked")
+    try:
+        with query_budget(connection, timeout, max_steps):
+            width = result_width(gold_sql, connection)
+    except Exception:
+        return None
+    if width == pred_result.shape[1]:
         return None
+    prefilter_stats.add("exec_skipped")
+    return ResultMismatch("column_count")
 
-def is_exec_match(pred_sql, gold_sql, db_path, ignore_extra_columns=False) -> bool:
+def match_columns_by_values(pred_result, gold_result, one_to_one=False) -> list:
+    """
+    按列值集合对齐预测结果与真实结果的列，返回预测结果中匹配列的位置。
+    每列的值集合签名只计算一次，通过字典查找候选，仅对签名相同的列做精确的集合比较。
+    `one_to_one` 为真时每个真实列最多匹配一次。
+    """
+    gold_index = {}
+    for j in range(gold_result.shape[1]):
+        gold_index.setdefault(column_set_signature(gold_result.iloc[:, j]), []).append(j)
+
+    gold_sets = {}
+    common_columns = []
+    for i in range(pred_result.shape[1]):
+        candidates = gold_index.get(column_set_signature(pred_result.iloc[:, i]))
+        if not candidates:
+            continue
+        pred_set = set(pred_result.iloc[:, i])
+        for j in candidates:
+            if j not in gold_sets:
+                gold_sets[j] = set(gold_result.iloc[:, j])
+            # 签名相同时再精确比较列的值
+            if pred_set == gold_sets[j]:
+                common_columns.append(i)
+                if one_to_one:
+                    candidates.remove(j)
+                break
+    return common_columns
+
+def is_exec_match(pred_sql, gold_sql, db_path, ignore_extra_columns=False, gold_signatures=None, timeout=None, max_steps=None, streaming=False, verify=False, rtol=None, atol=None,
+                  rules="ExecMatch", diagnostics="off", prefilter=False):
     """
     评估SQLite查询准确性，通过比较预测SQL结果和真实SQL结果。
     
     :param pred_sql: 预测的SQL查询
     :param gold_sql: 真实的SQL查询
-    :param db_path: SQLite数据库路径
+    :param db_path: SQLite数据库路径，或 SQLitePool.ConnectionPool
     :param ignore_extra_columns: 是否忽略预测结果中的额外列
+    :param gold_signatures: 预先计算的真实SQL结果签名（GoldPack.exec_signatures），提供时不再执行真实SQL
+    :param timeout: 每条查询的执行时间上限（秒），超时的查询被中断并判为不匹配（信息中报告为 "Timeout"）
+    :param max_steps: 每条查询的 SQLite 虚拟机步数上限
+    :param streaming: 流式比较结果的多重集合摘要，不经过 pandas（见 match_streaming；宽松模式需要逐列数据，不受影响）
+    :param verify: 摘要相等后再做一次精确校验：流式比较时精确比较两边的结果；使用 gold_signatures 时签名一致后执行真实SQL，
+        按原始数据比较。不校验时摘要碰撞（概率约为 2^-64）会把不一致的结果判为一致
+    :param rtol: 数值列的相对容差；与 atol 任一给出时按类型逐列比较（见 ColumnCompare.compare_columns_typed），
+        宽松模式下也按容差对齐列（见 ColumnCompare.match_columns_close）
+    :param atol: 数值列的绝对容差
+    :param rules: 比较规则，见 RULES
+    :param diagnostics: 诊断级别（见 Diagnostics.LEVELS）：off 返回 bool；summary / full 返回 (bool, 信息)
+    :param prefilter: 预测SQL执行成功后先获取真实SQL结果的列数，列数不同时不再执行真实SQL（见 prefilter_columns；宽松模式不适用）
     :return: 返回准确率（正确结果的比例）
     """
-    # 连接到SQLite数据库
-    conn = sqlite3.connect(db_path)
+    check_level(diagnostics)
+    # 获取当前线程的只读连接（连接池复用，不在此关闭）；数据库无法打开时按预测SQL执行失败处理
+    try:
+        conn = get_connection(db_path)
+    except sqlite3.Error as e:
+        return report(ResultMismatch("pred_error", e), diagnostics)
     
+    # 容差比较需要真实结果的逐列数据，不使用流式摘要和预先计算的签名
+    typed = rtol is not None or atol is not None
+    if streaming and not ignore_extra_columns and not typed:
+        stream_signature = gold_signatures.get("stream") if gold_signatures else None
+        return match_streaming(pred_sql, gold_sql, conn, stream_signature, verify, timeout, max_steps, diagnostics)
+    gold_signature = gold_signatures.get(rules) if gold_signatures and not typed else None
+
     # 执行预测查询和真实查询
-    pred_result = execute_sql(pred_sql, conn)
-    gold_result = execute_sql(gold_sql, conn)
-    
-    # 关闭数据库连接
-    conn.close()
-    
-    if pred_result is None or gold_result is None:
-        # print("Error in executing one of the SQL queries.")
-        return False
+    pred_result = execute_sql(pred_sql, conn, timeout, max_steps)
+    gold_result = None
+    if gold_signature is not None and verify:
+        # 签名是 64 位摘要：签名一致时再执行真实SQL，按原始数据比较，排除哈希碰撞
+        with measure("exec_compare"):
+            mismatch = _compare_results(pred_result, None, gold_sql, ignore_extra_columns, gold_signature, rtol, atol, rules, diagnostics)
+        if mismatch is not None:
+            return report(mismatch, diagnostics)
+        gold_signature = None
+    if gold_signature is None:
+        if prefilter and not ignore_extra_columns and not isinstance(pred_result, Exception):
+            mismatch = prefilter_columns(pred_result, gold_sql, conn, timeout, max_steps)
+            if mismatch is not None:
+                return report(mismatch, diagnostics)
+        gold_result = execute_sql(gold_sql, conn, timeout, max_steps)
+    with measure("exec_compare"):
+        return compare_exec_results(pred_result, gold_result, gold_sql, ignore_extra_columns, gold_signature, rtol, atol, rules, diagnostics)
+
+def unordered_columns(pred_values, gold_values, rules: str = "ExecMatch") -> tuple:
+    """
+    无 ORDER BY 时用于比较的两组列（集合），规则见 RULES。
+    """
+    if rules == "ExecMatch_with_Err":
+        # 不打乱每一列的顺序，只忽略列顺序
+        pred_values = np.where(pred_values == None, "", pred_values)
+        gold_values = np.where(gold_values == None, "", gold_values)
+        return set(tuple(col) for col in zip(*pred_values)), set(tuple(col) for col in zip(*gold_values))
+
+    # 对每列的数据进行排序，忽略列顺序
+    def sorted_columns(values, key=None):
+        return set(tuple(sorted(values[:, i], key=key)) for i in range(values.shape[1]))
+    try:
+        return sorted_columns(pred_values), sorted_columns(gold_values)
+    except TypeError:
+        # 列中混有无法互相比较的值（如 None 与字符串）时按规范化表示排序，两边使用同一种顺序
+        return sorted_columns(pred_values, value_token), sorted_columns(gold_values, value_token)
+
+def _compare_results(pred_result, gold_result, gold_sql, ignore_extra_columns=False, gold_signature=None, rtol=None, atol=None,
+                     rules="ExecMatch", diagnostics="off"):
+    typed = rtol is not None or atol is not None
+
+    # 执行失败：提供签名时，真实SQL的错误来自签名
+    if gold_signature is not None and gold_signature.get("error"):
+        gold_result = signature_error(gold_signature)
+    mismatch = execution_mismatch(pred_result, gold_result)
+    if mismatch is not None:
+        return mismatch
+    if gold_signature is not None:
+        return _match_signatures(pred_result, gold_signature, gold_sql, ignore_extra_columns, rules)
     
     # 提取数值部分，忽略列名
     pred_values = pred_result.values
@@ -41,45 +346,40 @@ def is_exec_match(pred_sql, gold_sql, db_path, ignore_extra_columns=False) -> bo
     
     # 宽松模式：只保留pred_result中包含gold_result中的列
     if ignore_extra_columns:
-        # 通过数值比较来确定共享列，而不是列名
-        common_columns = []
-        for pred_col in pred_result.columns:
-            for gold_col in gold_result.columns:
-                # 通过比较列的值来确定是否相同
-                if (set(pred_result[pred_col]) == set(gold_result[gold_col])):
-                    common_columns.append(pred_col)
-                    break
+        # 通过数值比较来确定共享列，而不是列名；给出容差时按容差对齐
+        one_to_one = rules == "ExecMatch_with_Err"
+        if typed:
+            common_columns = match_columns_close(pred_result, gold_result, rtol or 0.0, atol or 0.0, one_to_one)
+        else:
+            common_columns = match_columns_by_values(pred_result, gold_result, one_to_one)
         
         if not common_columns:
             # print("Predicted SQL query does not contain the required columns.")
-            return False
+            return ResultMismatch("missing_columns")
         
-        # print(f"Common columns based on values: {common_columns}")
+        if diagnostics == "full":
+            print(f"Common columns based on values: {[pred_result.columns[i] for i in common_columns]}")
         # 只保留在pred_result中与gold_result匹配的列
-        pred_result = pred_result[common_columns]
+        pred_result = pred_result.iloc[:, common_columns]
         pred_values = pred_result.values  # 重新获取经过筛选后的数值部分
     
-    # 提取数值部分，忽略列名
-    pred_values = pred_result.values
-    gold_values = gold_result.values
-    
     # 检查列数是否一致
     if pred_values.shape[1] != gold_values.shape[1]:
         # print("The number of columns in the predicted and gold queries do not match.")
-        return False
+        return ResultMismatch("column_count")
     
     # 检查 gold_sql 中是否包含 "ORDER BY"
     ignore_order = "ORDER BY" not in gold_sql.upper()
     
-    # 如果需要忽略顺序，对数据进行排序
+    # 按类型逐列比较：数值列用 NumPy 向量化排序并按容差比较，字符串列单独精确比较
+    if typed:
+        if compare_columns_typed(pred_result, gold_result, not ignore_order, rtol or 0.0, atol or 0.0):
+            return None
+        return ResultMismatch("values")
+    
     if ignore_order:
-        # 对每列的数据进行排序，忽略列顺序
-        pred_values_sorted = [tuple(sorted(pred_values[:, i])) for i in range(pred_values.shape[1])]
-        gold_values_sorted = [tuple(sorted(gold_values[:, i])) for i in range(gold_values.shape[1])]
-        
         # 将列数据作为集合进行比较，忽略列顺序
-        pred_columns = set(pred_values_sorted)
-        gold_columns = set(gold_values_sorted)
+        pred_columns, gold_columns = unordered_columns(pred_values, gold_values, rules)
     else:
         # 如果有ORDER BY，我们直接比较列数据
         pred_columns = set(tuple(pred_values[:, i]) for i in range(pred_values.shape[1]))
@@ -88,10 +388,17 @@ def is_exec_match(pred_sql, gold_sql, db_path, ignore_extra_columns=False) -> bo
     # 检查pred_result和gold_result中的列是否一致
     if pred_columns == gold_columns:
         # print("The predicted SQL query matches the gold query.")
-        return True  # 完全匹配
-    else:
-        # print("The predicted SQL query is incorrect.")
-        return False  # 结果不匹配
+        return None  # 完全匹配
+    # print("The predicted SQL query is incorrect.")
+    return ResultMismatch("values")  # 结果不匹配
+
+def compare_exec_results(pred_result, gold_result, gold_sql, ignore_extra_columns=False, gold_signature=None, rtol=None, atol=None,
+                         rules="ExecMatch", diagnostics="off"):
+    """
+    比较 execute_sql 得到的预测结果与真实结果（或执行时的异常），返回值见 Diagnostics.report。
+    提供 gold_signature 时 gold_result 为 None，用签名比较；参数含义同 is_exec_match。
+    """
+    return report(_compare_results(pred_result, gold_result, gold_sql, ignore_extra_columns, gold_signature, rtol, atol, rules, diagnostics), diagnostics)
     
 # # demo
 # db_path = './SQL_Evaluation/dset.sqlite'
@@ -1,105 +1,59 @@
-import sqlite3
-import pandas as pd
-import numpy as np
+import ExecMatch
+from ExecMatch import execute_sql, execute_digest, signature_digest, match_columns_by_values
+from Diagnostics import check_level
 
-def execute_sql(sql_query, connection):
+# 与 ExecMatch 使用同一个比较引擎，保留原来的接口：按 "ExecMatch_with_Err" 规则比较，返回 (是否一致, 信息)
+RULES = "ExecMatch_with_Err"
+
+def get_result_signature(result, gold_sql) -> dict:
     """
-    执行SQL查询并返回结果。
+    计算查询结果的摘要签名，比较规则与 is_exec_match 一致：
+    column_sets 对应宽松模式下的列值集合，column_keys 对应逐列比较时的列数据（无 ORDER BY 时 None 视为空字符串）。
     """
-    try:
-        return pd.read_sql_query(sql_query, connection)
-    except Exception as e:
-        return e
+    return ExecMatch.get_result_signature(result, gold_sql, RULES)
 
-def is_exec_match(pred_sql, gold_sql, db_path, ignore_extra_columns=False) -> bool:
+def match_signatures(pred_result, gold_signature: dict, gold_sql, ignore_extra_columns=False):
+    """
+    用真实结果的摘要签名比较预测结果，无需真实结果的原始数据。
+    """
+    return ExecMatch.match_signatures(pred_result, gold_signature, gold_sql, ignore_extra_columns, RULES, "full")
+
+def compare_digests(pred_digest, gold_digest):
+    """
+    比较 execute_digest 得到的两个摘要（或执行时的异常），返回 (是否一致, 信息)。
     """
-    评估SQLite查询准确性，通过比较预测SQL结果和真实SQL结果。
-    
-    :param pred_sql: 预测的SQL查询
-    :param gold_sql: 真实的SQL查询
-    :param db_path: SQLite数据库路径
-    :param ignore_extra_columns: 是否忽略预测结果中的额外列
-    :return: 返回准确率（正确结果的比例）
+    return ExecMatch.compare_digests(pred_digest, gold_digest, "full")
+
+def verify_digests(pred_sql, gold_sql, connection, ordered, timeout=None, max_steps=None):
+    """
+    摘要相等后的精确校验，排除哈希碰撞。
+    """
+    return ExecMatch.verify_digests(pred_sql, gold_sql, connection, ordered, timeout, max_steps, "full")
+
+def match_streaming(pred_sql, gold_sql, connection, gold_signature=None, verify=False, timeout=None, max_steps=None):
     """
-    # 连接到SQLite数据库
-    conn = sqlite3.connect(db_path)
-    
-    # 执行预测查询和真实查询
-    pred_result = execute_sql(pred_sql, conn)
-    gold_result = execute_sql(gold_sql, conn)
-    
-    # 关闭数据库连接
-    conn.close()
-    
-    if isinstance(pred_result, Exception):
-        return False, f"Error executing SQL query: {pred_result}"
-    if isinstance(gold_result, Exception):
-        return False, f"Gold SQL design error: {gold_result}"
-    
-    # 提取数值部分，忽略列名
-    pred_values = pred_result.values
-    gold_values = gold_result.values
-    
-    # 宽松模式：只保留pred_result中包含gold_result中的列
-    if ignore_extra_columns:
-        # 通过数值比较来确定共享列，而不是列名
-        common_columns = []
-        temp_gold_result_columns = list(gold_result.columns)
-        for pred_col in pred_result.columns:
-            for gold_col in temp_gold_result_columns:
-                # 通过比较列的值来确定是否相同
-                if (set(pred_result[pred_col]) == set(gold_result[gold_col])):
-                    common_columns.append(pred_col)
-                    temp_gold_result_columns.remove(gold_col)
-                    break
-        
-        if not common_columns:
-            # print("Predicted SQL query does not contain the required columns.")
-            return False, "Predicted SQL query does not contain the required columns."
-        
-        print(f"Common columns based on values: {common_columns}")
-        # 只保留在pred_result中与gold_result匹配的列
-        pred_result = pred_result[common_columns]
-        pred_values = pred_result.values  # 重新获取经过筛选后的数值部分
-    
-    # print(pred_values.shape[1])
-    # print()
-    # print(gold_values.shape[1])
-    
-    # 检查列数是否一致
-    if pred_values.shape[1] != gold_values.shape[1]:
-        # print("The number of columns in the predicted and gold queries do not match.")
-        return False, "The number of columns in the predicted and gold queries do not match."
-    
-    # 检查 gold_sql 中是否包含 "ORDER BY"
-    ignore_order = "ORDER BY" not in gold_sql.upper()
-    
-    # 如果需要忽略顺序，对数据进行排序
-    if ignore_order:
-        # 对每列的数据进行排序，忽略列顺序
-        pred_values = np.where(pred_values == None, "", pred_values)
-        gold_values = np.where(gold_values == None, "", gold_values)
-        pred_values_sorted = sorted([tuple(col) for col in zip(*pred_values)])
-        gold_values_sorted = sorted([tuple(col) for col in zip(*gold_values)])
-        # fixed 不会打算每一列顺序，而是忽略列顺序
-        # print("pred_values_sorted", pred_values_sorted)
-        # print("gold_values_sorted", gold_values_sorted)
-        # 将列数据作为集合进行比较，忽略列顺序
-        pred_columns = set(pred_values_sorted)
-        gold_columns = set(gold_values_sorted)
-    else:
-        # 如果有ORDER BY，我们直接比较列数据
-        pred_columns = set(tuple(pred_values[:, i]) for i in range(pred_values.shape[1]))
-        gold_columns = set(tuple(gold_values[:, i]) for i in range(gold_values.shape[1]))
-    
-    # 检查pred_result和gold_result中的列是否一致
-    if pred_columns == gold_columns:
-        # print("The predicted SQL query matches the gold query.")
-        return True, None  # 完全匹配
-    else:
-        # print("The predicted SQL query is incorrect.")
-        return False, "The predicted SQL query is incorrect."  # 结果不匹配
-    
+    流式比较（见 ExecMatch.match_streaming），返回 (是否一致, 信息)。
+    """
+    return ExecMatch.match_streaming(pred_sql, gold_sql, connection, gold_signature, verify, timeout, max_steps, "full")
+
+def is_exec_match(pred_sql, gold_sql, db_path, ignore_extra_columns=False, gold_signatures=None, timeout=None, max_steps=None, streaming=False, verify=False, rtol=None, atol=None,
+                  diagnostics="full", prefilter=False):
+    """
+    评估SQLite查询准确性，通过比较预测SQL结果和真实SQL结果，返回 (是否一致, 信息)。
+    参数含义同 ExecMatch.is_exec_match；diagnostics="summary" 时信息中的执行错误不重复整条 SQL，"off" 时信息为 None。
+    """
+    check_level(diagnostics)
+    result = ExecMatch.is_exec_match(pred_sql, gold_sql, db_path, ignore_extra_columns, gold_signatures, timeout, max_steps, streaming, verify, rtol, atol,
+                                     RULES, diagnostics, prefilter)
+    return (result, None) if diagnostics == "off" else result
+
+def compare_exec_results(pred_result, gold_result, gold_sql, ignore_extra_columns=False, gold_signature=None, rtol=None, atol=None):
+    """
+    比较 execute_sql 得到的预测结果与真实结果（或执行时的异常），返回 (是否一致, 信息)。
+    提供 gold_signature 时 gold_result 为 None，用签名比较；参数含义同 is_exec_match。
+    """
+    return ExecMatch.compare_exec_results(pred_result, gold_result, gold_sql, ignore_extra_columns, gold_signature, rtol, atol, RULES, "full")
+
 # # demo
 # db_path = './database/dset.sqlite'
 # pred_sql = '''
@@ -0,0 +1,126 @@
+import hashlib
+from sqlglot.expressions import Expression, And, Or, Add
+
+# 结构比较时忽略的参数（与 expressions_equal 保持一致）
+IGNORED_ARGS = {"alias", "comments", "parent", "arg_key", "index", "recursive"}
+
+def filter_args(expr: Expression) -> dict:
+    """
+    过滤掉与结构无关的参数（别名、注释等）。
+    """
+    return {k: v for k, v in expr.args.items() if k not in IGNORED_ARGS}
+
+def stable_hash(data: bytes) -> int:
+    """
+    稳定的 64 位哈希，跨进程一致（不受 PYTHONHASHSEED 影响），可以落盘复用。
+    """
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+def scalar_token(value) -> bytes:
+    """
+    标量参数的规范化表示：`==` 相等的值必须得到相同的表示（如 1、1.0、True）。
+    """
+    if value is None:
+        return b"N"
+    if isinstance(value, (bool, int, float)):
+        if isinstance(value, float) and not value.is_integer():
+            return b"F" + repr(value).encode()
+        return b"I" + str(int(value)).encode()
+    if isinstance(value, str):
+        return b"S" + value.encode("utf-8", "surrogatepass")
+    return b"O" + type(value).__name__.encode() + b":" + repr(value).encode()
+
+# 满足结合律的二元运算：连续的同类节点（如 a AND b AND c）展开为有序的操作数列表后比较，
+# 长链不再形成很深的左倾树，不同的结合方式（(a AND b) AND c 与 a AND (b AND c)）视为相同
+CHAIN_TYPES = (And, Or, Add)
+
+def is_chain(expr: Expression) -> bool:
+    return isinstance(expr, CHAIN_TYPES) and filter_args(expr).keys() == {"this", "expression"}
+
+def chain_operands(expr: Expression) -> list:
+    """
+    展开连续的同类运算节点，按从左到右的顺序返回操作数（不展开括号）。
+    """
+    operands = []
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        if type(node) is type(expr) and is_chain(node):
+            stack.append(node.args["expression"])
+            stack.append(node.args["this"])
+        else:
+            operands.append(node)
+    return operands
+
+def node_children(value) -> list:
+    """
+    参与结构比较的子值：列表的元素；运算链的操作数；其他节点过滤后的参数。
+    """
+    if isinstance(value, list):
+        return value
+    if is_chain(value):
+        return chain_operands(value)
+    return list(filter_args(value).values())
+
+def fingerprint(value, memo: dict = None) -> int:
+    """
+    自底向上计算 SQL AST 的规范化结构指纹：
+    - 忽略别名、注释等参数；
+    - 列表参数按无序多重集合处理（子节点指纹排序后再合并）；
+    - AND / OR / + 运算链按展开后的有序操作数计算。
+    若 expressions_equal(a, b) 为真，则 fingerprint(a) == fingerprint(b)；反之指纹相同只说明“可能相等”，需要完整比较确认。
+    `memo` 以 id(node) 缓存已计算的指纹，同一棵树在一次比较中只遍历一遍。
+    使用显式栈后序遍历，耗时与树的大小成线性，不受 Python 递归深度限制。
+    """
+    if memo is None:
+        memo = {}
+    if not isinstance(value, (Expression, list)):
+        return stable_hash(scalar_token(value))
+
+    lists = {}  # 本次遍历中列表参数的指纹（列表不放入 memo）
+
+    def known(child):
+        if isinstance(child, Expression):
+            cached = memo.get(id(child))
+            return cached[0] if cached is not None else None
+        if isinstance(child, list):
+            return lists.get(id(child))
+        return stable_hash(scalar_token(child))
+
+    stack = [(value, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if known(node) is not None:
+            continue
+        if not expanded:
+            stack.append((node, True))
+            for child in node_children(node):
+                if isinstance(child, (Expression, list)) and known(child) is None:
+                    stack.append((child, False))
+            continue
+
+        if isinstance(node, list):
+            items = sorted(known(item) for item in node)
+            lists[id(node)] = stable_hash(b"L" + b",".join(b"%x" % item for item in items))
+        elif is_chain(node):
+            operands = b",".join(b"%x" % known(operand) for operand in chain_operands(node))
+            memo[id(node)] = (stable_hash(b"C" + type(node).__name__.encode() + b"|" + operands), node)
+        else:
+            parts = [b"E" + type(node).__name__.encode()]
+            for key, arg in sorted(filter_args(node).items()):
+                parts.append(key.encode() + b"=%x" % known(arg))
+            memo[id(node)] = (stable_hash(b"|".join(parts)), node)  # 同时持有节点引用，避免 id 被复用
+    return known(value)
+
+def build_fingerprint_index(node_map: dict, memo: dict = None) -> dict:
+    """
+    将 {名称: 节点} 映射按节点的结构指纹建立索引：{指纹: [(名称, 节点), ...]}。
+    桶内保持原映射的顺序。
+    """
+    if memo is None:
+        memo = {}
+
+    index = {}
+    for name, node in node_map.items():
+        index.setdefault(fingerprint(node, memo), []).append((name, node))
+    return index
@@ -0,0 +1,183 @@
+import os
+import sys
+import gzip
+import time
+import pickle
+import hashlib
+import sqlglot
+import pandas as pd
+from sqlglot import parse_one
+from sqlglot.optimizer import optimize
+from Fingerprint import fingerprint
+from ResultDigest import StreamDigest, contains_nan
+from SQLitePool import get_connection, query_budget, QueryTimeout, read_sql_rows, rows_frame
+from getSQLtables import extract_table_names
+import ExecMatch
+import ExecMatch_with_Err
+
+# 格式变化时递增，旧的 pack 文件会被整体重建
+PACK_VERSION = 4
+
+# 各 ExecMatch 模块的结果签名函数（比较规则不同，分别保存）
+SIGNATURE_BUILDERS = {
+    "ExecMatch": ExecMatch.get_result_signature,
+    "ExecMatch_with_Err": ExecMatch_with_Err.get_result_signature,
+}
+
+def db_stamp(db_path) -> tuple:
+    """
+    数据库文件的标识（路径、大小、修改时间），任一变化都会使执行结果摘要失效。
+    """
+    stat = os.stat(db_path)
+    return (os.path.abspath(db_path), stat.st_size, stat.st_mtime_ns)
+
+def sql_key(sql: str, dialect: str) -> str:
+    return hashlib.sha256(f"{dialect}\0{sql}".encode("utf-8")).hexdigest()
+
+def build_equi_entry(gold_sql: str, dialect: str) -> dict:
+    """
+    真实SQL的语法树部分：优化后的语法树、结构指纹、涉及的表。只依赖 SQL 文本。
+    """
+    entry = {"sql": gold_sql, "tables": extract_table_names(gold_sql)}
+    start = time.perf_counter()
+    try:
+        expression = optimize(parse_one(gold_sql, dialect=dialect))
+    except Exception as e:
+        entry.update(ast=None, fingerprint=None, parse_error=str(e), build_seconds=0.0)
+        return entry
+    entry.update(ast=expression, fingerprint=fingerprint(expression), parse_error=None,
+                 build_seconds=time.perf_counter() - start)
+    return entry
+
+def build_exec_entry(gold_sql: str, connection, timeout=None, max_steps=None) -> dict:
+    """
+    真实SQL的执行部分：在数据库上执行一次（受 timeout / max_steps 限制），由同一份结果得到流式比较用的 "stream" 摘要、
+    各 ExecMatch 模块的结果签名，以及执行耗时 "seconds"（批量执行匹配时用于估计每行的耗时）。
+    超出预算时不保存任何签名；结果中有 NaN 时不保存各模块的签名（见 ResultDigest.contains_nan）。评测时缺少的签名照常执行真实SQL。
+    签名只保存 64 位摘要，不保存结果本身；用签名得到的结论与实际执行相同，除非两份不同的结果摘要碰撞（此时误判为一致），
+    需要排除碰撞时评测使用 verify=True（见 ExecMatch.is_exec_match）。
+    """
+    start = time.perf_counter()
+    try:
+        with query_budget(connection, timeout, max_steps):
+            columns, rows = read_sql_rows(gold_sql, connection)
+    except QueryTimeout:
+        return {}
+    except Exception as e:
+        cause = e.__cause__
+        # 流式比较直接报告数据库的错误，逐列比较报告 pandas 的错误（见 ExecMatch.signature_error）
+        signatures = {"stream": {"error": str(cause if cause is not None else e)}}
+        signatures.update({name: {"error": str(e), "cause": None if cause is None else str(cause)} for name in SIGNATURE_BUILDERS})
+        return signatures
+    result = rows_frame(columns, rows)
+    seconds = time.perf_counter() - start
+
+    digest = StreamDigest(len(columns), "ORDER BY" in gold_sql.upper())
+    for row in rows:
+        digest.add(row)
+    signatures = {"stream": digest.signature(), "seconds": seconds}
+    if not contains_nan(result.values):
+        signatures.update({name: build(result, gold_sql) for name, build in SIGNATURE_BUILDERS.items()})
+    return signatures
+
+class GoldPack:
+    """
+    预先计算的真实SQL数据：评测时直接读取，跳过真实SQL的解析、优化和执行。
+    """
+
+    def __init__(self, db_stamp: tuple, dialect: str = "sqlite", entries: dict = None):
+        self.version = PACK_VERSION
+        self.sqlglot_version = sqlglot.__version__
+        self.db_stamp = db_stamp
+        self.dialect = dialect
+        self.entries = entries if entries is not None else {}
+
+    def get(self, gold_sql: str) -> dict:
+        return self.entries.get(sql_key(gold_sql, self.dialect))
+
+    def exec_signatures(self, gold_sql: str) -> dict:
+        """
+        获取真实SQL的结果签名（按 ExecMatch 模块名 / "stream" 区分），不存在时返回 None（调用方退回到实际执行）。
+        """
+        entry = self.get(gold_sql)
+        if entry is None:
+            return None
+        return entry.get("exec")
+
+    def install(self, sql_cache):
+        """
+        将语法树预加载到 EquiMatch 的 sql_cache 中。
+        """
+        for entry in self.entries.values():
+            if entry["ast"] is not None:
+                sql_cache.pin(entry["sql"], self.dialect, entry["ast"], entry["build_seconds"])
+
+    def save(self, pack_path):
+        with gzip.open(pack_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_gold_pack(pack_path, db_path=None):
+    """
+    读取 pack 文件；文件不存在或格式/sqlglot 版本不一致时返回 None。
+    数据库文件变化时保留语法树部分，清除执行结果部分。
+    """
+    if not os.path.exists(pack_path):
+        return None
+    try:
+        with gzip.open(pack_path, "rb") as f:
+            pack = pickle.load(f)
+    except Exception as e:
+        print(f"[WARN] 读取 gold pack 失败: {e}")
+        return None
+    if not isinstance(pack, GoldPack) or pack.version != PACK_VERSION or pack.sqlglot_version != sqlglot.__version__:
+        return None
+
+    if db_path is not None:
+        stamp = db_stamp(db_path)
+        if pack.db_stamp != stamp:
+            for entry in pack.entries.values():
+                entry["exec"] = None
+            pack.db_stamp = stamp
+    return pack
+
+def build_gold_pack(gold_sqls, db_path, pack_path=None, dialect: str = "sqlite", timeout=None, max_steps=None) -> GoldPack:
+    """
+    构建（或增量更新）gold pack：已有且未失效的条目直接复用，只为新增或变化的真实SQL计算。
+    传入 `pack_path` 时从该文件读取旧数据，并在有更新时写回。
+    `timeout` / `max_steps` 为执行真实SQL的预算（与 is_exec_match 相同），超出预算的真实SQL在评测时照常执行。
+    """
+    pack = load_gold_pack(pack_path, db_path) if pack_path else None
+    if pack is None or pack.dialect != dialect:
+        pack = GoldPack(db_stamp(db_path), dialect)
+
+    updated = False
+    entries = {}
+    for gold_sql in gold_sqls:
+        key = sql_key(gold_sql, dialect)
+        if key in entries:
+            continue
+        entry = pack.entries.get(key)
+        if entry is None:
+            entry = build_equi_entry(gold_sql, dialect)
+            entry["exec"] = None
+            updated = True
+        if entry["exec"] is None:
+            entry["exec"] = build_exec_entry(gold_sql, get_connection(db_path), timeout, max_steps)
+            updated = True
+        entries[key] = entry
+
+    # 数据集中已不存在的真实SQL从 pack 中移除
+    updated = updated or entries.keys() != pack.entries.keys()
+    pack.entries = entries
+    if pack_path and updated:
+        pack.save(pack_path)
+    return pack
+
+
+if __name__ == '__main__':
+    # 用法: python GoldPack.py dataset.csv dset.sqlite gold.pack
+    dataset_path, db_path, pack_path = sys.argv[1:4]
+    dataset = pd.read_csv(dataset_path)
+    start = time.perf_counter()
+    pack = build_gold_pack(dataset['gold_sql'], db_path, pack_path)
+    print(f"Gold pack: {len(pack.entries)} entries, {time.perf_counter() - start:.2f}s -> {pack_path}")
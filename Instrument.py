@@ -0,0 +1,143 @@
+import io
+import time
+import random
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+
+# 细分阶段：fetch/equi/exec 为评测流水线的阶段，其余由 EquiMatch*/ExecMatch*/SQLCache 在调用时记录
+STAGES = ["fetch", "equi", "prefilter", "parse", "optimize", "alias", "compare", "exec", "sqlite", "pandas", "exec_compare"]
+# 结果大小：两条查询结果的总行数和总单元格数
+SIZES = ["result_rows", "result_cells"]
+# 输出 CSV 中的额外列
+COLUMNS = [f"{stage}_seconds" for stage in STAGES] + SIZES
+
+_local = threading.local()
+
+@contextmanager
+def recording(metrics: dict):
+    """
+    在当前线程上开启记录：期间的 measure / record_size 累加到 `metrics` 中（如评测中的一行）。
+    未开启记录时 measure / record_size 不做任何事。
+    """
+    previous = getattr(_local, "metrics", None)
+    _local.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+
+@contextmanager
+def measure(stage: str):
+    """
+    记录代码块的耗时到 f"{stage}_seconds"（同一行内多次调用累加，如真实SQL和预测SQL各解析一次）。
+    """
+    metrics = getattr(_local, "metrics", None)
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        key = f"{stage}_seconds"
+        metrics[key] = metrics.get(key, 0.0) + time.perf_counter() - start
+
+def record_size(name: str, value: int):
+    metrics = getattr(_local, "metrics", None)
+    if metrics is not None:
+        metrics[name] = metrics.get(name, 0) + value
+
+def fill_columns(row: dict) -> dict:
+    """
+    补齐未执行的阶段（耗时记为 0）。
+    """
+    for column in COLUMNS:
+        row.setdefault(column, 0 if column in SIZES else 0.0)
+    return row
+
+class StageStats:
+    """
+    各阶段耗时的汇总统计（p50 / p95 / max）。每个阶段最多保留 `max_samples` 个样本（蓄水池抽样），
+    内存占用与行数无关；行数不超过 max_samples 时分位数是精确的。
+    """
+
+    def __init__(self, max_samples: int = 100000, seed: int = 0):
+        self.max_samples = max_samples
+        self.count = {}
+        self.maximum = {}
+        self.samples = {}
+        self._random = random.Random(seed)
+
+    def add(self, row: dict):
+        for stage in STAGES:
+            value = row.get(f"{stage}_seconds")
+            if value is None:
+                continue
+            n = self.count.get(stage, 0) + 1
+            self.count[stage] = n
+            self.maximum[stage] = max(self.maximum.get(stage, value), value)
+            samples = self.samples.setdefault(stage, [])
+            if len(samples) < self.max_samples:
+                samples.append(value)
+            else:
+                j = self._random.randrange(n)
+                if j < self.max_samples:
+                    samples[j] = value
+
+    def summary(self) -> dict:
+        result = {}
+        for stage in STAGES:
+            samples = sorted(self.samples.get(stage, ()))
+            if not samples:
+                continue
+            result[stage] = {
+                "count": self.count[stage],
+                "p50": samples[int(0.50 * (len(samples) - 1))],
+                "p95": samples[int(0.95 * (len(samples) - 1))],
+                "max": self.maximum[stage],
+            }
+        return result
+
+    def format(self) -> str:
+        lines = [f"{'stage':<14}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'max ms':>12}"]
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<14}{s['count']:>8}{s['p50'] * 1000:>12.3f}{s['p95'] * 1000:>12.3f}{s['max'] * 1000:>12.3f}")
+        return "\n".join(lines)
+
+class SlowestRows:
+    """
+    保留耗时最长的 n 行（按 equi + exec 耗时），用于评测结束后只对这些行做性能分析。
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.rows = []  # [(耗时, 行)]，按耗时降序
+
+    def add(self, row: dict):
+        if self.n <= 0:
+            return
+        cost = row.get("equi_seconds", 0.0) + row.get("exec_seconds", 0.0)
+        if len(self.rows) < self.n or cost > self.rows[-1][0]:
+            self.rows.append((cost, row))
+            self.rows.sort(key=lambda item: item[0], reverse=True)
+            del self.rows[self.n:]
+
+def profile_rows(rows, score, limit: int = 30, profile_path=None) -> str:
+    """
+    用 cProfile 重新评分 `rows`（score(row) 执行一行的等价性匹配和执行匹配），返回按累计耗时排序的前 `limit` 项。
+    给出 `profile_path` 时同时保存原始统计数据，可用 snakeviz 等工具查看。
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        for row in rows:
+            score(row)
+    finally:
+        profiler.disable()
+    if profile_path:
+        profiler.dump_stats(profile_path)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
@@ -0,0 +1,37 @@
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+def make_session(pool_size: int = 8) -> requests.Session:
+    """
+    创建复用 keep-alive 连接的 HTTP 会话，连接池大小与并发数一致。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_prediction(session, url, question, timeout=60, retries=3, backoff=0.5) -> dict:
+    """
+    请求生成接口获取一条预测结果。连接错误、超时和 5xx 响应按指数退避重试，
+    最终失败时返回 {"type": "error", "text": ...}，不抛出异常。
+    """
+    error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * (2 ** (attempt - 1)))
+        try:
+            response = session.get(url, params={'question': question}, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        except requests.HTTPError as e:
+            error = e
+            if e.response is not None and e.response.status_code < 500:
+                break  # 4xx 不重试
+        except ValueError as e:
+            error = e  # 响应不是 JSON
+            break
+    return {'type': 'error', 'text': f"Request failed: {error}"}
@@ -0,0 +1,177 @@
+import threading
+from collections import Counter, namedtuple
+from sqlglot.expressions import Expression, Select, SetOperation, Subquery, Table, TableAlias, Alias, CTE, AggFunc, Window, Group, Having
+
+# 查询摘要：在未优化的语法树上一次遍历得到，用于在 optimize 之前快速判定两条 SQL 不等价。
+# optimize 会删减语法树（裁剪子查询中未使用的列、删除未使用的 CTE 和多余的外连接、解嵌套子查询等），
+# 因此每项特征分为"一定保留"和"可能出现"两部分，只有一方一定具有、另一方不可能具有时才判定不等价：
+# tables         一定保留的真实表名（从最外层查询经 FROM / 内连接 / 子查询 / CTE 引用可达的表）
+# names          可能出现的全部名称（所有表名、CTE 名和别名）
+# arity          最外层查询的列数，含 * 时为 None（展开后的列数未知）
+# aggregate      最外层查询本身有聚合函数、GROUP BY 或 HAVING
+# may_aggregate  任意位置有聚合，或有嵌套查询（解嵌套子查询时会生成 GROUP BY / MAX / ARRAY_AGG）
+# window         最外层查询的列中有窗口函数
+# may_window     任意位置有窗口函数
+# set_op         最外层的集合运算（如 "UNION ALL"），普通查询为 "SELECT"
+QuerySummary = namedtuple("QuerySummary", ["tables", "names", "arity", "aggregate", "may_aggregate", "window", "may_window", "set_op"])
+
+# 按判断顺序排列的特征
+FEATURES = ["tables", "arity", "aggregate", "window", "set_op"]
+
+def _name(name: str) -> str:
+    # 标识符的大小写在优化时会被统一，比较时一律忽略大小写
+    return name.lower()
+
+def _outer_nodes(select: Select):
+    """
+    遍历最外层查询的列、GROUP BY、HAVING，不进入其中的子查询。
+    """
+    for key in ("expressions", "group", "having"):
+        value = select.args.get(key)
+        for root in value if isinstance(value, list) else [value] if value is not None else []:
+            yield from root.walk(prune=lambda node: isinstance(node, (Select, Subquery)))
+
+def _stable_tables(root: Expression, ctes: dict) -> frozenset:
+    """
+    从最外层查询出发，经 FROM、内连接、FROM 中的子查询和被引用的 CTE 可达的真实表名，优化后一定保留。
+    外连接的派生表（子查询、CTE）可能被 eliminate_joins 删除，不计入。
+    """
+    tables = set()
+    visited = set()
+    stack = [root]
+    while stack:
+        query = stack.pop()
+        if isinstance(query, SetOperation):
+            stack.extend((query.this, query.expression))
+            continue
+        if isinstance(query, Subquery):
+            stack.append(query.this)
+            continue
+        if not isinstance(query, Select):
+            continue
+        sources = []
+        from_ = query.args.get("from")
+        if from_ is not None:
+            sources.append(from_.this)
+        for join in query.args.get("joins") or []:
+            source = join.this
+            derived = not isinstance(source, Table) or _name(source.name) in ctes and not source.args.get("db")
+            if join.side and derived:
+                continue
+            sources.append(source)
+        for source in sources:
+            if isinstance(source, Subquery):
+                stack.append(source.this)
+            elif isinstance(source, Table):
+                name = _name(source.name)
+                if name in ctes and not source.args.get("db"):
+                    # 同名 CTE 只有一个时才能确定引用的是哪一个
+                    if len(ctes[name]) == 1 and name not in visited:
+                        visited.add(name)
+                        stack.append(ctes[name][0].this)
+                elif name:
+                    tables.add(name)
+    return frozenset(tables)
+
+def summarize(expression: Expression) -> QuerySummary:
+    """
+    计算语法树的查询摘要（见 QuerySummary）；不是查询语句（SELECT / 集合运算）时返回 None。
+    对已优化的语法树同样适用（此时的摘要就是比较时的实际情况）。
+    """
+    if isinstance(expression, Select):
+        set_op = "SELECT"
+        outer = expression
+    elif isinstance(expression, SetOperation):
+        set_op = expression.key.upper() + ("" if expression.args.get("distinct") else " ALL")
+        outer = expression
+        while isinstance(outer, SetOperation):
+            outer = outer.this
+    else:
+        return None
+
+    names = set()
+    ctes = {}
+    may_aggregate = may_window = False
+    for node in expression.walk():
+        if isinstance(node, Table):
+            names.add(_name(node.name))
+        elif isinstance(node, (TableAlias, Alias)):
+            names.add(_name(node.alias))
+        elif isinstance(node, CTE):
+            names.add(_name(node.alias))
+            ctes.setdefault(_name(node.alias), []).append(node)
+        elif isinstance(node, (AggFunc, Group, Having)):
+            may_aggregate = True
+        elif isinstance(node, Window):
+            may_window = True
+        elif isinstance(node, (Select, SetOperation)) and node is not expression and not isinstance(node.parent, SetOperation):
+            may_aggregate = True  # 嵌套查询
+
+    arity = aggregate = window = None
+    if isinstance(outer, Select):
+        projections = outer.expressions
+        arity = None if any(projection.is_star for projection in projections) else len(projections)
+        aggregate = window = False
+        for node in _outer_nodes(outer):
+            if isinstance(node, (AggFunc, Group, Having)):
+                aggregate = True
+            elif isinstance(node, Window):
+                window = True
+
+    return QuerySummary(_stable_tables(expression, ctes), frozenset(names), arity, bool(aggregate), may_aggregate,
+                        bool(window), may_window, set_op)
+
+def reject_reason(summary1: QuerySummary, summary2: QuerySummary):
+    """
+    比较两条 SQL 的查询摘要，能确定两者优化后不等价时返回 (特征, 值1, 值2)，否则返回 None。
+    """
+    if summary1 is None or summary2 is None:
+        return None
+    if not summary1.tables <= summary2.names or not summary2.tables <= summary1.names:
+        return "tables", sorted(summary1.tables), sorted(summary2.tables)
+    if summary1.arity is not None and summary2.arity is not None and summary1.arity != summary2.arity:
+        return "arity", summary1.arity, summary2.arity
+    if summary1.aggregate and not summary2.may_aggregate or summary2.aggregate and not summary1.may_aggregate:
+        return "aggregate", summary1.aggregate, summary2.aggregate
+    if summary1.window and not summary2.may_window or summary2.window and not summary1.may_window:
+        return "window", summary1.window, summary2.window
+    if summary1.set_op != summary2.set_op:
+        return "set_op", summary1.set_op, summary2.set_op
+    return None
+
+class PrefilterStats:
+    """
+    快速判定的计数（线程安全）：equi_checked / equi_rejected / equi_<特征> 为等价性匹配中检查和直接判定不等价的次数，
+    exec_checked / exec_skipped 为执行匹配中检查列数和因此省去真实SQL执行的次数。
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, n: int = 1):
+        with self._lock:
+            self._counts[name] += n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def since(self, snapshot: dict) -> dict:
+        """
+        自 snapshot 以来的计数（如一轮评测中的计数）。
+        """
+        current = self.snapshot()
+        return {name: count - snapshot.get(name, 0) for name, count in current.items() if count != snapshot.get(name, 0)}
+
+def format_stats(counts: dict) -> str:
+    lines = []
+    if counts.get("equi_checked"):
+        reasons = ", ".join(f"{feature} {counts[f'equi_{feature}']}" for feature in FEATURES if counts.get(f"equi_{feature}"))
+        lines.append(f"Prefilter Equi-Match: {counts.get('equi_rejected', 0)}/{counts['equi_checked']} rejected without optimizing"
+                     + (f" ({reasons})" if reasons else ""))
+    if counts.get("exec_checked"):
+        lines.append(f"Prefilter Exec-Match: {counts.get('exec_skipped', 0)}/{counts['exec_checked']} gold executions skipped (column count)")
+    return "\n".join(lines)
+
+prefilter_stats = PrefilterStats()
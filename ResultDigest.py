@@ -0,0 +1,233 @@
+import math
+import sqlite3
+import hashlib
+import numpy as np
+from collections import Counter
+from Fingerprint import scalar_token
+
+def value_token(value) -> bytes:
+    """
+    查询结果中单个值的规范化表示（numpy 标量先转换为 Python 标量，NaN 统一表示）。
+    """
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        try:
+            value = value.item()
+        except (TypeError, ValueError):
+            pass
+    if isinstance(value, float) and math.isnan(value):
+        return b"nan"
+    if isinstance(value, bytes):
+        return b"B" + value
+    return scalar_token(value)
+
+def contains_nan(values) -> bool:
+    """
+    查询结果（DataFrame.values）中是否有 NaN（数值列和字符串列中的 NULL 会被 pandas 转换为 NaN）。
+    逐列比较时 NaN 与任何值（包括另一个 NaN）都不相等，而 value_token 把所有 NaN 表示为同一个值，
+    因此含 NaN 的结果不能用摘要代替原始数据比较。
+    """
+    if values.dtype.kind == "f":
+        return bool(np.isnan(values).any())
+    if values.dtype.kind == "O":
+        return any(isinstance(value, float) and math.isnan(value) for value in values.ravel())
+    return False
+
+def digest_tokens(tokens) -> int:
+    """
+    按顺序合并一组 token 的稳定哈希（长度前缀，避免拼接歧义）。
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for token in tokens:
+        h.update(len(token).to_bytes(4, "big"))
+        h.update(token)
+    return int.from_bytes(h.digest(), "big")
+
+def sequence_digest(values) -> int:
+    """
+    有序序列的摘要，等价于比较 tuple(values)。
+    """
+    return digest_tokens(value_token(v) for v in values)
+
+def multiset_digest(values) -> int:
+    """
+    多重集合的摘要，等价于比较 tuple(sorted(values))。
+    """
+    return digest_tokens(sorted(value_token(v) for v in values))
+
+def set_digest(values) -> int:
+    """
+    集合的摘要，等价于比较 set(values)。
+    """
+    return digest_tokens(sorted(set(value_token(v) for v in values)))
+
+def column_set_signature(values) -> tuple:
+    """
+    列的值集合签名：(集合摘要, 基数)。用于按值对齐列时先查字典，只对签名相同的候选做精确比较。
+    """
+    tokens = set(value_token(v) for v in values)
+    return digest_tokens(sorted(tokens)), len(tokens)
+
+def digest_set_of(digests) -> int:
+    """
+    一组摘要作为集合的摘要，等价于比较 set(...)。
+    """
+    return digest_tokens(b"%016x" % d for d in sorted(set(digests)))
+
+MASK64 = (1 << 64) - 1
+
+def token_hash(token: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(token, digest_size=8).digest(), "big")
+
+class StreamDigest:
+    """
+    流式结果摘要：逐行折叠，内存占用与结果大小无关，时间与行数成线性关系。
+    - 行按列顺序无关的规范形式（值 token 排序）计入摘要，重复行不会被合并；
+    - 每一列单独计入摘要，比较时作为多重集合，忽略列顺序；
+    - ordered=True 时行序参与摘要（真实SQL带 ORDER BY），否则行摘要与列摘要都与行序无关。
+    """
+
+    def __init__(self, column_count: int, ordered: bool = False):
+        self.ordered = ordered
+        self.column_count = column_count
+        self.row_count = 0
+        if ordered:
+            self._rows = hashlib.blake2b(digest_size=8)
+            self._columns = [hashlib.blake2b(digest_size=8) for _ in range(column_count)]
+        else:
+            self._rows = 0
+            self._columns = [0] * column_count
+
+    def add(self, row):
+        tokens = [value_token(v) for v in row]
+        row_hash = digest_tokens(sorted(tokens))
+        if self.ordered:
+            self._rows.update(row_hash.to_bytes(8, "big"))
+            for column, token in zip(self._columns, tokens):
+                column.update(len(token).to_bytes(4, "big"))
+                column.update(token)
+        else:
+            # 多重集合摘要：对元素哈希求和（模 2^64），与顺序无关
+            self._rows = (self._rows + row_hash) & MASK64
+            columns = self._columns
+            for i, token in enumerate(tokens):
+                columns[i] = (columns[i] + token_hash(token)) & MASK64
+        self.row_count += 1
+
+    def signature(self) -> dict:
+        if self.ordered:
+            rows = int.from_bytes(self._rows.digest(), "big")
+            columns = [int.from_bytes(c.digest(), "big") for c in self._columns]
+        else:
+            rows, columns = self._rows, list(self._columns)
+        return {
+            "ordered": self.ordered,
+            "column_count": self.column_count,
+            "row_count": self.row_count,
+            "rows": rows,
+            "columns": sorted(columns),
+        }
+
+def stream_digest(cursor, ordered: bool = False, batch_size: int = 1000) -> dict:
+    """
+    从已执行的游标分批读取结果并计算 StreamDigest 签名。
+    """
+    digest = StreamDigest(len(cursor.description or ()), ordered)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            digest.add(row)
+    return digest.signature()
+
+def exact_summary(cursor, ordered: bool = False, batch_size: int = 1000):
+    """
+    与 StreamDigest 比较规则相同、但不做哈希的精确表示，用于摘要相等后的校验（内存与结果大小成正比）。
+    """
+    column_count = len(cursor.description or ())
+    rows = [] if ordered else Counter()
+    columns = [[] if ordered else Counter() for _ in range(column_count)]
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        for row in batch:
+            tokens = [value_token(v) for v in row]
+            if ordered:
+                rows.append(tuple(sorted(tokens)))
+                for column, token in zip(columns, tokens):
+                    column.append(token)
+            else:
+                rows[tuple(sorted(tokens))] += 1
+                for column, token in zip(columns, tokens):
+                    column[token] += 1
+    if ordered:
+        columns_key = Counter(tuple(column) for column in columns)
+    else:
+        columns_key = Counter(frozenset(column.items()) for column in columns)
+    return rows, columns_key
+
+class DigestUnavailable(Exception):
+    """
+    无法用 DigestAggregate 计算摘要（查询无法包装为子查询、没有结果列、聚合函数本身出错），
+    与查询本身的执行错误区分：调用方只在这种情况下退回逐行读取游标。
+    """
+
+class DigestAggregate:
+    """
+    SQLite 自定义聚合函数：由 SQLite 逐行调用 step 折叠 StreamDigest（行序无关），只把几个数字返回给调用方。
+    每行的值仍然转换为 Python 对象传给 step，省去的是游标逐行取结果、构造元组的开销，而不是 Python 中的逐行处理。
+    """
+
+    def __init__(self):
+        self.digest = None
+
+    def step(self, *values):
+        if self.digest is None:
+            self.digest = StreamDigest(len(values))
+        self.digest.add(values)
+
+    def finalize(self):
+        if self.digest is None:
+            return None
+        signature = self.digest.signature()
+        return " ".join("%x" % n for n in [signature["row_count"], signature["rows"], *signature["columns"]])
+
+DIGEST_AGGREGATE = "sql_evaluation_digest"
+
+def aggregate_digest(connection, sql_query: str) -> dict:
+    """
+    将查询包装为子查询，用 DigestAggregate 计算行序无关的 StreamDigest 签名，
+    结果与 stream_digest(cursor, ordered=False) 相同。
+    包装后无法编译（LIMIT 0 只编译、不取数据）、没有结果列或聚合函数出错时抛出 DigestUnavailable；
+    查询执行中的错误原样抛出，调用方不必再执行一次原查询。
+    """
+    connection.create_aggregate(DIGEST_AGGREGATE, -1, DigestAggregate)
+    subquery = sql_query.strip().rstrip(";")
+    # 先取列名（子查询中重复的列名会被 SQLite 自动改名，如 "name:1"）
+    try:
+        description = connection.execute(f"SELECT * FROM (\n{subquery}\n) LIMIT 0").description or ()
+    except sqlite3.Error as e:
+        # 也可能是查询本身无法编译，逐行读取时由原查询报告错误
+        raise DigestUnavailable(str(e)) from e
+    column_count = len(description)
+    if column_count == 0:
+        raise DigestUnavailable("Query returns no columns")
+    columns = ", ".join('"' + d[0].replace('"', '""') + '"' for d in description)
+    try:
+        encoded = connection.execute(f"SELECT {DIGEST_AGGREGATE}({columns}) FROM (\n{subquery}\n)").fetchone()[0]
+    except sqlite3.OperationalError as e:
+        if str(e).startswith("user-defined aggregate"):
+            raise DigestUnavailable(str(e)) from e
+        raise
+
+    if encoded is None:
+        return StreamDigest(column_count).signature()
+    numbers = [int(n, 16) for n in encoded.split()]
+    return {
+        "ordered": False,
+        "column_count": column_count,
+        "row_count": numbers[0],
+        "rows": numbers[1],
+        "columns": numbers[2:],
+    }
@@ -0,0 +1,150 @@
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from sqlglot import parse_one
+from sqlglot.optimizer import optimize
+from Fingerprint import fingerprint
+from Instrument import measure
+from Prefilter import summarize
+
+# 缓存条目：优化后的语法树、别名映射、整棵树的结构指纹、每个节点的指纹缓存，以及查询摘要（见 Prefilter）
+ParsedSQL = namedtuple("ParsedSQL", ["expression", "alias_map", "fingerprint", "memo", "summary"])
+
+def parse_sql(sql: str, dialect: str, get_alias_map, expression=None) -> ParsedSQL:
+    """
+    解析并优化 SQL，计算别名映射和结构指纹。`expression` 为已解析（未优化）的语法树时跳过解析。
+    """
+    if expression is None:
+        with measure("parse"):
+            expression = parse_one(sql, dialect=dialect)
+    with measure("optimize"):
+        expression = optimize(expression)
+    return make_parsed_sql(expression, get_alias_map)
+
+def make_parsed_sql(expression, get_alias_map) -> ParsedSQL:
+    """
+    由已优化的语法树构建缓存条目（别名映射和指纹只需一次遍历）。
+    """
+    memo = {}
+    return ParsedSQL(expression, get_alias_map(expression), fingerprint(expression, memo), memo, summarize(expression))
+
+class SQLCache:
+    """
+    以 (SQL 文本, 方言) 为键的 LRU 缓存，保存 parse_one + optimize 的结果。
+    缓存的语法树是共享的，使用方不能原地修改（normalize_expression 只在拷贝上替换）。
+    """
+
+    def __init__(self, get_alias_map, maxsize: int = 1024):
+        self.get_alias_map = get_alias_map
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0  # 命中缓存所节省的解析/优化耗时（按首次构建耗时估算）
+        self._entries = OrderedDict()
+        self._pinned = {}  # 预加载的条目（如 GoldPack），不参与淘汰
+        self._summaries = OrderedDict()  # 只解析未优化的 SQL：(查询摘要, 未优化的语法树)，见 summary()
+        self._lock = threading.Lock()
+
+    def get(self, sql: str, dialect: str = "sqlite") -> ParsedSQL:
+        """
+        获取解析结果，未命中时构建并加入缓存；解析失败的 SQL 不缓存，异常直接抛出。
+        """
+        key = (sql, dialect)
+        with self._lock:
+            pinned = self._pinned.get(key)
+            if pinned is not None:
+                self.hits += 1
+                self.saved_seconds += pinned[1]
+                return pinned[0]
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += cached[1]
+                return cached[0]
+            self.misses += 1
+            parsed = self._summaries.pop(key, None)
+
+        start = time.perf_counter()
+        entry = parse_sql(sql, dialect, self.get_alias_map, parsed[1] if parsed is not None else None)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            if self.maxsize > 0:
+                self._entries[key] = (entry, elapsed)
+                self._entries.move_to_end(key)
+                self._evict()
+        return entry
+
+    def summary(self, sql: str, dialect: str = "sqlite") -> tuple:
+        """
+        获取查询摘要和对应的语法树，用于在优化之前快速判定（见 Prefilter）：
+        已缓存优化结果时直接使用，否则只解析不优化；解析得到的语法树保留到 get() 时再优化，不重复解析。
+        解析失败时异常直接抛出。
+        """
+        key = (sql, dialect)
+        with self._lock:
+            cached = self._pinned.get(key) or self._entries.get(key)
+            if cached is not None:
+                return cached[0].summary, cached[0].expression
+            parsed = self._summaries.get(key)
+            if parsed is not None:
+                self._summaries.move_to_end(key)
+                return parsed
+
+        with measure("parse"):
+            expression = parse_one(sql, dialect=dialect)
+        parsed = (summarize(expression), expression)
+
+        with self._lock:
+            if self.maxsize > 0:
+                self._summaries[key] = parsed
+                self._evict()
+        return parsed
+
+    def pin(self, sql: str, dialect: str, expression, build_seconds: float = 0.0) -> ParsedSQL:
+        """
+        预加载已优化的语法树（例如从 GoldPack 读取），跳过 parse_one + optimize，且不会被淘汰。
+        `build_seconds` 为原始构建耗时，用于统计节省的时间。
+        """
+        entry = make_parsed_sql(expression, self.get_alias_map)
+        with self._lock:
+            self._pinned[(sql, dialect)] = (entry, build_seconds)
+        return entry
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        while len(self._summaries) > self.maxsize:
+            self._summaries.popitem(last=False)
+
+    def resize(self, maxsize: int):
+        """
+        调整缓存容量，超出部分按最近最少使用淘汰；maxsize=0 表示关闭缓存。
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pinned.clear()
+            self._summaries.clear()
+            self.hits = self.misses = self.evictions = 0
+            self.saved_seconds = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "pinned": len(self._pinned),
+                "summaries": len(self._summaries),
+                "maxsize": self.maxsize,
+                "saved_seconds": self.saved_seconds,
+            }
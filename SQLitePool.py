@@ -0,0 +1,276 @@
+import os
+import time
+import sqlite3
+import pathlib
+import threading
+import pandas as pd
+from contextlib import contextmanager
+from Instrument import measure, record_size
+
+class ConnectionPool:
+    """
+    以数据库路径为单位的只读连接池：每个线程持有一个连接，跨多次 is_exec_match 调用复用，
+    保留页缓存和已解析的 schema。线程结束后，它的连接在下一次创建连接或调用 release_finished() 时关闭。
+
+    :param db_path: SQLite数据库路径
+    :param immutable: 以 immutable=1 打开（评测期间数据库文件不会被修改时使用，省去加锁和变更检测）
+    :param cache_size: PRAGMA cache_size，负数表示 KiB
+    :param mmap_size: PRAGMA mmap_size，单位字节，0 表示不使用内存映射
+    :param load: 预加载方式（适合数据库在网络存储上、整轮评测反复扫描的情况）：
+        None     直接读文件；
+        "memory" 用 backup API 读入本进程的内存数据库，每个线程首次取连接时再从中复制一份私有的内存数据库，
+                 线程之间不共享页缓存、互不加锁，内存占用为 (线程数 + 1) 倍数据库大小；
+        "mmap"   把 mmap_size 调到不小于文件大小并顺序预读一遍文件，所有线程和进程共享操作系统页缓存，
+                 只占一份内存，数据库较大且执行线程较多时优先使用。
+        加载耗时和内存占用记录在 load_stats 中（见 format_load_stats）：bytes 为一份数据库的大小，
+        copies / total_bytes 为当前的份数和总大小（memory 为读入的一份加上每个线程的一份，随连接的创建和关闭更新），
+        peak_bytes 为 total_bytes 的最大值。
+    """
+
+    def __init__(self, db_path, immutable=False, cache_size=-65536, mmap_size=256 * 1024 * 1024, load=None):
+        self.db_path = os.path.abspath(db_path)
+        self.immutable = immutable
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.load = load
+        self.load_stats = None
+        self._master = None  # load="memory" 时读入的内存数据库，各线程的连接从中复制
+        self._local = threading.local()
+        self._connections = []  # [(创建连接的线程, 连接)]
+        self._lock = threading.Lock()
+        if load is not None:
+            self._load()
+
+    @property
+    def uri(self) -> str:
+        uri = pathlib.Path(self.db_path).as_uri() + "?mode=ro"
+        if self.immutable:
+            uri += "&immutable=1"
+        return uri
+
+    def _load(self):
+        start = time.perf_counter()
+        if self.load == "memory":
+            master = sqlite3.connect(":memory:", check_same_thread=False)
+            source = sqlite3.connect(self.uri, uri=True)
+            try:
+                source.backup(master)
+            finally:
+                source.close()
+            self._master = master
+            page_count = master.execute("PRAGMA page_count").fetchone()[0]
+            page_size = master.execute("PRAGMA page_size").fetchone()[0]
+            size = page_count * page_size
+        elif self.load == "mmap":
+            size = os.path.getsize(self.db_path)
+            self.mmap_size = max(self.mmap_size or 0, size)
+            # 顺序预读，让后续查询命中页缓存
+            with open(self.db_path, "rb") as f:
+                while f.read(16 * 1024 * 1024):
+                    pass
+        else:
+            raise ValueError(f"Unknown load mode: {self.load}")
+
+        self.load_stats = {
+            "mode": self.load,
+            "load_seconds": time.perf_counter() - start,
+            "bytes": size,
+        }
+        with self._lock:
+            self._count_copies()
+
+    def _count_copies(self):
+        # 调用方持有 _lock；mmap 的所有连接共享操作系统页缓存，只算一份
+        if self.load_stats is None:
+            return
+        copies = 1 + len(self._connections) if self._master is not None else int(self.load == "mmap")
+        total = copies * self.load_stats["bytes"]
+        self.load_stats.update(copies=copies, total_bytes=total, peak_bytes=max(total, self.load_stats.get("peak_bytes", 0)))
+
+    def _open(self) -> sqlite3.Connection:
+        if self._master is not None:
+            connection = sqlite3.connect(":memory:", check_same_thread=False)
+            with self._lock:
+                self._master.backup(connection)
+        else:
+            connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        if self.cache_size is not None:
+            connection.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        if self.mmap_size is not None:
+            connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        connection.execute("PRAGMA query_only = 1")
+        return connection
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        获取当前线程的连接，首次调用时创建。
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            self.release_finished()
+            connection = self._open()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append((threading.current_thread(), connection))
+                self._count_copies()
+        return connection
+
+    def release_finished(self):
+        """
+        关闭已结束的线程创建的连接（如上一轮评测的流水线线程），释放它们的页缓存。
+        """
+        with self._lock:
+            finished = [connection for thread, connection in self._connections if not thread.is_alive()]
+            self._connections = [(thread, connection) for thread, connection in self._connections if thread.is_alive()]
+            self._count_copies()
+        for connection in finished:
+            connection.close()
+
+    def close(self):
+        """
+        关闭所有线程创建的连接。
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            master, self._master = self._master, None
+            if self.load_stats is not None:
+                self.load_stats.update(copies=0, total_bytes=0)
+        for _, connection in connections:
+            connection.close()
+        self._local = threading.local()
+        if master is not None:
+            master.close()
+
+def format_load_stats(load_stats: dict) -> str:
+    mib = 1024 * 1024
+    return (f"Database load ({load_stats['mode']}): {load_stats['bytes'] / mib:.1f} MiB in {load_stats['load_seconds']:.2f}s, "
+            f"peak {load_stats['peak_bytes'] / mib:.1f} MiB in memory")
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool_key(db_path, options: dict) -> tuple:
+    return os.path.abspath(db_path), tuple(sorted(options.items()))
+
+def get_pool(db_path, **options) -> ConnectionPool:
+    """
+    获取（或创建）数据库路径对应的共享连接池，相同路径和参数返回同一个连接池。
+    """
+    key = _pool_key(db_path, options)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_path, **options)
+            _pools[key] = pool
+        return pool
+
+def get_connection(db) -> sqlite3.Connection:
+    """
+    `db` 可以是数据库路径，也可以是 ConnectionPool；返回当前线程可用的只读连接（不要关闭）。
+    """
+    if isinstance(db, ConnectionPool):
+        return db.connection()
+    return get_pool(db).connection()
+
+def close_pool(db_path, **options):
+    """
+    关闭并移除 get_pool(db_path, **options) 对应的连接池（不存在时什么也不做），之后再获取时重新创建。
+    """
+    with _pools_lock:
+        pool = _pools.pop(_pool_key(db_path, options), None)
+    if pool is not None:
+        pool.close()
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+class QueryTimeout(Exception):
+    """
+    查询超出执行预算（墙钟时间或 SQLite 虚拟机步数）被中断。
+    """
+
+@contextmanager
+def query_budget(connection: sqlite3.Connection, timeout: float = None, max_steps: int = None, interval: int = 1000):
+    """
+    在 `connection` 上限制查询的执行预算，通过 progress handler 每 `interval` 条虚拟机指令检查一次：
+    超过 `timeout` 秒或 `max_steps` 步时中断查询，并抛出 QueryTimeout（而不是普通的执行错误）。
+    两者都为 None 时不做限制。
+    """
+    if timeout is None and max_steps is None:
+        yield
+        return
+
+    if max_steps is not None:
+        interval = max(1, min(interval, max_steps))
+    deadline = time.perf_counter() + timeout if timeout is not None else None
+    state = {"steps": 0, "exceeded": None}
+
+    def handler():
+        state["steps"] += interval
+        if max_steps is not None and state["steps"] >= max_steps:
+            state["exceeded"] = f"exceeded {max_steps} VM steps"
+            return 1
+        if deadline is not None and time.perf_counter() > deadline:
+            state["exceeded"] = f"exceeded {timeout}s"
+            return 1
+        return 0
+
+    connection.set_progress_handler(handler, interval)
+    try:
+        yield
+    except Exception as e:
+        if state["exceeded"]:
+            raise QueryTimeout(state["exceeded"]) from e
+        raise
+    finally:
+        connection.set_progress_handler(None, 0)
+
+def read_sql_rows(sql_query: str, connection: sqlite3.Connection) -> tuple:
+    """
+    执行查询并取出全部结果，返回 (列名, 行)；执行出错时抛出与 pd.read_sql_query 相同的 DatabaseError（__cause__ 为 SQLite 的错误）。
+    """
+    with measure("sqlite"):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql_query)
+        except sqlite3.Error as e:
+            raise pd.errors.DatabaseError(f"Execution failed on sql '{sql_query}': {e}") from e
+        try:
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    return columns, rows
+
+def rows_frame(columns: list, rows: list) -> pd.DataFrame:
+    """
+    由 read_sql_rows 的结果构建 DataFrame，列类型推断与 pd.read_sql_query 相同。
+    """
+    with measure("pandas"):
+        result = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    record_size("result_rows", len(result))
+    record_size("result_cells", result.size)
+    return result
+
+def read_sql_frame(sql_query: str, connection: sqlite3.Connection) -> pd.DataFrame:
+    """
+    执行查询并构建 DataFrame，与 pd.read_sql_query 的结果（列类型推断）和错误信息相同；
+    分别记录 SQLite 执行取数（sqlite）与构建 DataFrame（pandas）的耗时，以及结果大小（见 Instrument）。
+    """
+    return rows_frame(*read_sql_rows(sql_query, connection))
+
+def result_width(sql_query: str, connection: sqlite3.Connection) -> int:
+    """
+    不取数据，只获取查询结果的列数：把查询包装为 LIMIT 0 的子查询执行，SQLite 不会计算任何结果行。
+    查询无法包装（如包含多条语句）时抛出 sqlite3.Error。
+    """
+    with measure("sqlite"):
+        cursor = connection.execute(f"SELECT * FROM (\n{sql_query.strip().rstrip(';')}\n) LIMIT 0")
+        try:
+            return len(cursor.description)
+        finally:
+            cursor.close()
@@ -0,0 +1,98 @@
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# 统一大小写的关键字（SQLite 的关键字和不加引号的标识符都不区分大小写，统一后解析和执行结果不变）
+KEYWORDS = {
+    "SELECT", "FROM", "WHERE", "GROUP", "BY", "ORDER", "HAVING", "LIMIT", "OFFSET", "JOIN", "LEFT", "RIGHT",
+    "INNER", "OUTER", "CROSS", "NATURAL", "ON", "USING", "AS", "AND", "OR", "NOT", "IN", "IS", "NULL", "LIKE",
+    "GLOB", "BETWEEN", "DISTINCT", "UNION", "ALL", "INTERSECT", "EXCEPT", "CASE", "WHEN", "THEN", "ELSE",
+    "END", "ASC", "DESC", "WITH", "EXISTS", "CAST", "VALUES",
+}
+
+# 字符串、带引号的标识符和注释原样保留；其余部分按空白、单词、单个符号切分
+_SEGMENT = re.compile(
+    r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|--[^\n]*\n?|/\*.*?\*/)|(\s+)|(\w+)|(.)""",
+    re.DOTALL,
+)
+
+def normalize_sql(sql: str) -> str:
+    """
+    规范化 SQL 文本用于去重：合并空白、去掉括号和逗号两侧的空白与末尾分号、统一关键字大小写。
+    字符串、带引号的标识符和注释不做改动，规范化前后的 SQL 解析结果和执行结果相同。
+    """
+    if not isinstance(sql, str):
+        return sql
+    parts = []
+    pending_space = False
+    for quoted, space, word, symbol in _SEGMENT.findall(sql):
+        if space:
+            pending_space = bool(parts)
+            continue
+        if word:
+            token = word.upper() if word.upper() in KEYWORDS else word
+        else:
+            token = quoted or symbol
+        # 括号和逗号两侧的空白不影响分词
+        if pending_space and token not in ("(", ")", ",") and parts[-1] not in ("(", ","):
+            parts.append(" ")
+        parts.append(token)
+        pending_space = False
+    text = "".join(parts)
+    while text.endswith(";"):
+        text = text[:-1].rstrip()
+    return text
+
+class ScoreCache:
+    """
+    评分结果去重缓存：以 (评分类型, 规范化后的真实SQL, 规范化后的预测SQL) 为键，
+    相同组合只评分一次，其余行直接复用结果。多个线程同时遇到同一组合时只有一个线程计算，其余等待结果。
+    每次评测使用单独的缓存（数据库和评测参数在一次评测内不变），按最近最少使用淘汰。
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute) -> tuple:
+        """
+        返回 (结果, 是否复用)。`compute` 抛出异常时不缓存，等待同一组合的线程收到同一个异常。
+        """
+        with self._lock:
+            future = self._entries.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                self._entries[key] = future
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if not owner:
+            return future.result(), True
+
+        try:
+            result = compute()
+        except Exception as e:
+            with self._lock:
+                if self._entries.get(key) is future:
+                    del self._entries[key]
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result, False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
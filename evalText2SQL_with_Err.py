@@ -1,53 +1,47 @@
-import requests
-import pandas as pd
 from ExecMatch_with_Err import is_exec_match
-from EquiMatch_with_Err import is_equi_match
+from EquiMatch_with_Err import is_equi_match, sql_cache
+from EvalRunner import Matchers, run_evaluation
 
-def evalText2SQL(dataset_path, db_path, ignore_extra_columns=False):
-    dataset = pd.read_csv(dataset_path)
-    querys = dataset['query']
-    results = []
-    for query in querys:
-        url = 'http://localhost:8084/api/v0/generate_sql'
-        params = {
-            'question': query
-        }
-        response = requests.get(url, params=params).json()
-        print(response)
-        if response['type'] == 'sql':
-            results.append(response['text'])
-        else:
-            results.append('Vanna.AI error, response text: ' + response['text'])
-    dataset['pred_sql'] = results
+def evalText2SQL(dataset_path, db_path, ignore_extra_columns=False, gold_pack_path=None, db_load=None, exec_options=None,
+                 api_url='http://localhost:8084/api/v0/generate_sql', fetch_options=None, workers=None,
+                 checkpoint_path=None, output_path=None, chunk_size=1000, dedup=True,
+                 instrument=False, profile_slowest=0, profile_path=None, diagnostics='full', prefilter=False):
+    """
+    获取数据集中每个问题的预测SQL，计算 Equi-Match 与 Exec-Match 分数（流程见 EvalRunner.run_evaluation）。
 
-    equi_golds = []
-    equi_preds = []
-    equi_matchs = []
-    equi_msgs = []
-    exec_matchs = []
-    exec_msgs = []
-    for gold_sql, predict_sql in zip(dataset['gold_sql'], dataset['pred_sql']):
-        equi_gold, equi_pred, equi_match, equi_msg = is_equi_match(gold_sql, predict_sql)
-        exec_match, exec_msg = is_exec_match(pred_sql=predict_sql, gold_sql=gold_sql, db_path=db_path, ignore_extra_columns=ignore_extra_columns)
-        equi_golds.append(equi_gold)
-        equi_preds.append(equi_pred)
-        equi_matchs.append(equi_match)
-        equi_msgs.append(equi_msg)
-        exec_matchs.append(exec_match)
-        exec_msgs.append(exec_msg)
-    dataset['equi_gold'] = equi_golds
-    dataset['equi_pred'] = equi_preds
-    dataset['equi_match'] = equi_matchs
-    dataset['equi_msg'] = equi_msgs
-    dataset['exec_match'] = exec_matchs
-    dataset['exec_msg'] = exec_msgs
+    :param output_path: 流式模式：按块读取数据集（CSV 或 JSON Lines），结果逐块写入 output_path，
+        只保留分数的累计值，内存占用与数据集大小无关；此时返回的 dataset 为 None
+    :param chunk_size: 流式模式下每次读取和写出的行数
+    :param dedup: 按 (真实SQL, 预测SQL) 去重（SQL 文本先经过 normalize_sql 规范化），本次评测中相同组合只评分一次，
+        结果复用到其余行（见 ScoreDedup.ScoreCache）
+    :param instrument: 记录每行各阶段的耗时（获取预测、解析、优化、别名匹配、结构比较、SQLite 执行、构建 DataFrame、结果比较）
+        和结果大小，作为额外的列写入结果，并在结束时打印各阶段耗时的 p50/p95/max（见 Instrument）
+    :param profile_slowest: 评测结束后用 cProfile 重新评分耗时最长的 N 行（按 Equi + Exec 耗时），打印累计耗时最多的函数；
+        重新评分前清空解析缓存，与这些行首次评分时的开销一致
+    :param profile_path: 保存 cProfile 统计数据的路径，可用 snakeviz 等工具查看
+    :param prefilter: 快速判定（见 Prefilter）：Equi-Match 先比较两条 SQL 未优化的查询摘要（表、列数、聚合、窗口函数、集合运算），
+        能确定不等价时不再优化；Exec-Match 在预测结果与真实SQL结果的列数不同时不再执行真实SQL。分数不变，
+        结束时打印两者各自直接判定的次数。默认关闭：直接判定的行 equi_gold / equi_pred 为未优化的SQL文本，
+        equi_msg / exec_msg 为快速判定的信息，与完整比较的输出不同
+    :param diagnostics: 不匹配信息的详细程度（见 Diagnostics.LEVELS）：full 输出别名替换后的 SQL 和完整信息；
+        summary 只输出简短信息；off 不生成信息，equi_gold / equi_pred / equi_msg / exec_msg 为空
+    :return: (dataset, equi_match_score, exec_match_score)
+    """
+    def equi(gold_sql, pred_sql, prefilter):
+        equi_gold, equi_pred, equi_match, equi_msg = is_equi_match(gold_sql, pred_sql, diagnostics=diagnostics, prefilter=prefilter)
+        return {'equi_gold': equi_gold, 'equi_pred': equi_pred, 'equi_match': equi_match, 'equi_msg': equi_msg}
 
-    # 分数
-    equi_match_score = sum(equi_matchs) / len(equi_matchs)
-    exec_match_score = sum(exec_matchs) / len(exec_matchs)
-    print(f'Equi-Match: {equi_match_score}')
-    print(f'Exec-Match: {exec_match_score}')
-    return dataset, equi_match_score, exec_match_score
+    def execute(pred_sql, gold_sql, prefilter, **options):
+        exec_match, exec_msg = is_exec_match(pred_sql=pred_sql, gold_sql=gold_sql, diagnostics=diagnostics, prefilter=prefilter, **options)
+        return {'exec_match': exec_match, 'exec_msg': exec_msg}
+
+    matchers = Matchers('evalText2SQL_with_Err', 'pred_sql', ['equi_gold', 'equi_pred', 'equi_match', 'equi_msg', 'exec_match', 'exec_msg'],
+                        sql_cache, equi, execute, lambda response: 'Vanna.AI error, response text: ' + response['text'],
+                        {'diagnostics': diagnostics}, ['equi_msg', 'exec_msg'])
+    return run_evaluation(matchers, dataset_path, db_path, ignore_extra_columns=ignore_extra_columns, gold_pack_path=gold_pack_path,
+                          db_load=db_load, exec_options=exec_options, api_url=api_url, fetch_options=fetch_options, workers=workers,
+                          checkpoint_path=checkpoint_path, output_path=output_path, chunk_size=chunk_size, dedup=dedup,
+                          instrument=instrument, profile_slowest=profile_slowest, profile_path=profile_path, prefilter=prefilter)
 
 
 if __name__ == '__main__':
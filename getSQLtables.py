@@ -86,6 +86,7 @@ def extract_table_names(sql: str):
         print(f"[ERROR] SQL 解析失败: {e}")
         return set()
 
-# 提取表名
-tables = extract_table_names(sql)
-print(tables)
+if __name__ == '__main__':
+    # 提取表名
+    tables = extract_table_names(sql)
+    print(tables)
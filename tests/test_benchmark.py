@@ -0,0 +1,30 @@
+import pytest
+import Benchmark
+from Benchmark import GENERATORS, make_database, run_benchmark, compare_baseline, format_report
+from ExecMatch_with_Err import is_exec_match
+from SQLitePool import close_pool
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("bench") / "bench.sqlite")
+    make_database(path, rows=200)
+    yield path
+    close_pool(path)
+
+@pytest.mark.parametrize("name", list(GENERATORS))
+@pytest.mark.parametrize("level", [1, 4])
+def test_generated_pairs_have_equal_results(db_path, name, level):
+    # 生成的预测SQL只改写别名和顺序，结果与真实SQL相同，执行阶段比较的是完整结果
+    gold_sql, pred_sql = GENERATORS[name](level)
+    assert is_exec_match(pred_sql, gold_sql, db_path, diagnostics="off")[0]
+
+def test_run_benchmark_and_compare_baseline(db_path):
+    results = run_benchmark(db_path, levels=(1, 2), repeat=1, generators={"in_list": Benchmark.in_list})
+    assert list(results["cases"]) == ["in_list-1", "in_list-2"]
+    assert results["meta"]["db_rows"] == 200
+    assert len(format_report(results).splitlines()) == 3
+    assert compare_baseline(results, results) == []
+
+    slower = {"cases": {name: {**case, "optimize": case["optimize"] + 1.0} for name, case in results["cases"].items()}}
+    regressions = compare_baseline(slower, results)
+    assert [(case, metric) for case, metric, *_ in regressions] == [("in_list-1", "optimize"), ("in_list-2", "optimize")]
@@ -0,0 +1,51 @@
+import sqlite3
+import pytest
+from CascadeMatch import cascade_match, fingerprint_match, summarize_cascade
+from SQLitePool import close_pool
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "t.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE t (id INTEGER, x INTEGER, a INTEGER)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?)", [(1, 3, 2), (2, 1, 3), (3, 2, 1)])
+    connection.commit()
+    connection.close()
+    yield path
+    close_pool(path)
+
+class Judge:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, sql1, sql2):
+        self.calls += 1
+        return {"result": self.result, "reason": "stub"}
+
+def test_fingerprint_tier_compares_unoptimized_trees():
+    assert fingerprint_match("SELECT id FROM t WHERE x > 1", "select id  from t where x > 1; -- same") == (True, None)
+    # 别名决定 ORDER BY a 引用的是哪一列，未优化的语法树不能忽略别名
+    assert not fingerprint_match("SELECT x AS a FROM t ORDER BY a", "SELECT x AS b FROM t ORDER BY a")[0]
+
+@pytest.mark.parametrize("pred_sql, decided_by, match, tiers", [
+    ("select id from t where x > 1", "fingerprint", True, ["fingerprint"]),
+    ("SELECT t.id FROM t WHERE 1 < t.x", "equi", True, ["fingerprint", "equi"]),
+    ("SELECT id FROM t WHERE a > 1", "exec", False, ["fingerprint", "equi", "exec"]),
+    ("SELECT id FROM t WHERE x >= 2", "llm", True, ["fingerprint", "equi", "exec", "llm"]),
+])
+def test_tiers_run_in_order_until_one_decides(db_path, pred_sql, decided_by, match, tiers):
+    judge = Judge(True)
+    record = cascade_match("SELECT id FROM t WHERE x > 1", pred_sql, db_path, judge=judge)
+    assert (record["decided_by"], record["match"]) == (decided_by, match)
+    assert list(record["tiers"]) == tiers
+    assert judge.calls == (decided_by == "llm")
+
+def test_without_judge_exec_decides(db_path):
+    records = [cascade_match("SELECT id FROM t WHERE x > 1", pred_sql, db_path)
+               for pred_sql in ["SELECT id FROM t WHERE x > 1", "SELECT id FROM t WHERE x >= 2"]]
+    assert [(record["decided_by"], record["match"], record["llm_needed"]) for record in records] == \
+        [("fingerprint", True, False), ("exec", True, True)]
+    summary = summarize_cascade(records)
+    assert summary["decided_by"] == {"fingerprint": 1, "equi": 0, "exec": 1, "llm": 0}
+    assert (summary["llm_needed"], summary["llm_calls"]) == (1, 0)
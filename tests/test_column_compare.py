@@ -0,0 +1,53 @@
+import sqlite3
+import pytest
+import pandas as pd
+import ExecMatch
+import ExecMatch_with_Err
+from ColumnCompare import match_columns_close
+from SQLitePool import close_pool
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "t.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE t (id INTEGER, name TEXT, amount REAL)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?)", [(1, "a", 0.1), (2, "b", 0.2), (3, "c", 0.7)])
+    connection.commit()
+    connection.close()
+    yield path
+    close_pool(path)
+
+def test_match_columns_close():
+    pred = pd.DataFrame({"id": [1, 2], "amount": [0.30000001, 0.1], "name": ["x", "y"]})
+    gold = pd.DataFrame({"amount": [0.1, 0.3], "name": ["y", "x"]})
+    assert match_columns_close(pred, gold) == [2]
+    assert match_columns_close(pred, gold, rtol=1e-6) == [1, 2]
+
+@pytest.mark.parametrize("module", [ExecMatch, ExecMatch_with_Err])
+def test_extra_columns_aligned_within_tolerance(db_path, module):
+    gold_sql = "SELECT amount FROM t"
+    pred_sql = "SELECT id, amount * 1.0000001 FROM t"
+    result = module.is_exec_match(pred_sql, gold_sql, db_path, ignore_extra_columns=True, diagnostics="off")
+    assert not (result[0] if isinstance(result, tuple) else result)
+    result = module.is_exec_match(pred_sql, gold_sql, db_path, ignore_extra_columns=True, rtol=1e-6, diagnostics="off")
+    assert result[0] if isinstance(result, tuple) else result
+
+def reference_common_columns(pred, gold, one_to_one):
+    # 逐列比较值集合（建立签名索引之前的做法）
+    gold_sets = [set(gold.iloc[:, j]) for j in range(gold.shape[1])]
+    common = []
+    for i in range(pred.shape[1]):
+        pred_set = set(pred.iloc[:, i])
+        if pred_set in gold_sets:
+            common.append(i)
+            if one_to_one:
+                gold_sets.remove(pred_set)
+    return common
+
+@pytest.mark.parametrize("one_to_one", [False, True])
+def test_match_columns_by_values_agrees_with_pairwise_sets(one_to_one):
+    pred = pd.DataFrame({"a": [1, 2, 2], "b": [1.0, 2.0, 1.0], "c": ["x", None, "x"], "d": [2, 1, 1], "e": [3, 3, 3]}, dtype=object)
+    gold = pd.DataFrame({"p": [2, 1, 1], "q": ["x", "x", None], "r": [3, 4, 3]}, dtype=object)
+    expected = reference_common_columns(pred, gold, one_to_one)
+    assert ExecMatch.match_columns_by_values(pred, gold, one_to_one) == expected
+    assert expected == ([0, 2] if one_to_one else [0, 1, 2, 3])
@@ -0,0 +1,43 @@
+import itertools
+import sqlite3
+import pytest
+from EquiBatch import batch_equi_match
+from EquiMatch_with_Err import is_equi_match, sql_cache
+from GoldPack import build_gold_pack
+
+GOLD_SQLS = [
+    "SELECT e.id, d.dname FROM emp AS e JOIN dept AS d ON e.dept = d.id",
+    "SELECT dept, COUNT(*) FROM emp GROUP BY dept",
+    "SELECT id FROM emp WHERE salary > 10 AND dept = 1",
+]
+PRED_SQLS = [
+    "SELECT x.id, y.dname FROM emp AS x JOIN dept AS y ON x.dept = y.id",
+    "SELECT dept, COUNT(*) FROM emp GROUP BY dept",
+    "SELECT id FROM emp WHERE dept = 1 AND salary > 10",
+    "SELECT id FROM emp",
+    "SELECT FROM",
+]
+PAIRS = list(itertools.product(GOLD_SQLS, PRED_SQLS))
+
+@pytest.fixture
+def gold_pack_path(tmp_path):
+    db_path = tmp_path / "t.sqlite"
+    connection = sqlite3.connect(db_path)
+    connection.execute("CREATE TABLE emp (id INTEGER, dept INTEGER, salary REAL)")
+    connection.execute("CREATE TABLE dept (id INTEGER, dname TEXT)")
+    connection.close()
+    path = str(tmp_path / "gold.pack")
+    build_gold_pack(GOLD_SQLS, str(db_path), path)
+    return path
+
+@pytest.mark.parametrize("diagnostics", ["full", "off"])
+def test_serial_and_parallel_batches_agree(gold_pack_path, diagnostics):
+    expected = [is_equi_match(sql1, sql2, diagnostics=diagnostics) for sql1, sql2 in PAIRS]
+    assert batch_equi_match(PAIRS, workers=1, gold_pack_path=gold_pack_path, diagnostics=diagnostics) == expected
+    assert batch_equi_match(PAIRS, workers=2, chunksize=4, gold_pack_path=gold_pack_path, diagnostics=diagnostics) == expected
+
+def test_serial_batch_keeps_the_module_cache(gold_pack_path):
+    before = sql_cache.stats()
+    batch_equi_match(PAIRS, workers=1, gold_pack_path=gold_pack_path, cache_size=2)
+    after = sql_cache.stats()
+    assert (after["maxsize"], after["pinned"]) == (before["maxsize"], before["pinned"])
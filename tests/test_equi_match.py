@@ -0,0 +1,94 @@
+import pytest
+from sqlglot import parse_one
+from EquiMatch import is_equi_match, expressions_equal, compare_lists_unordered, match_aliases, get_alias_map
+from Fingerprint import fingerprint
+
+@pytest.mark.parametrize("sql1, sql2", [
+    ("SELECT id FROM t WHERE (a = 1 AND b = 2) AND c = 3", "SELECT id FROM t WHERE a = 1 AND (b = 2 AND c = 3)"),
+    ("SELECT id FROM t WHERE (a = 1 OR b = 2) OR c = 3", "SELECT id FROM t WHERE a = 1 OR (b = 2 OR c = 3)"),
+    ("SELECT (a + b) + c FROM t", "SELECT a + (b + c) FROM t"),
+    ("SELECT id FROM t WHERE a IN (3, 1, 2)", "SELECT id FROM t WHERE a IN (1, 2, 3)"),
+    ("SELECT id FROM t WHERE a IN ('x', 'y', 'x')", "SELECT id FROM t WHERE a IN ('x', 'x', 'y')"),
+])
+def test_regrouped_chains_and_reordered_literals_match(sql1, sql2):
+    assert is_equi_match(sql1, sql2)
+
+@pytest.mark.parametrize("sql1, sql2", [
+    ("SELECT a - (b - c) FROM t", "SELECT (a - b) - c FROM t"),  # 减法不满足结合律
+    ("SELECT id FROM t WHERE a = 1 AND b = 2 OR c = 3", "SELECT id FROM t WHERE a = 1 AND (b = 2 OR c = 3)"),
+    ("SELECT id FROM t WHERE a IN (1, 2, 3)", "SELECT id FROM t WHERE a IN (1, 2, 4)"),
+    ("SELECT id FROM t WHERE a IN ('1', 2)", "SELECT id FROM t WHERE a IN (1, '2')"),  # 字符串与数字不同
+    ("SELECT id FROM t WHERE a IN ('x', 'x', 'y')", "SELECT id FROM t WHERE a IN ('x', 'y', 'y')"),  # 重复次数不同
+])
+def test_different_chains_and_literal_lists_do_not_match(sql1, sql2):
+    assert not is_equi_match(sql1, sql2)
+
+def test_long_chains_and_lists_compare_without_recursion():
+    # 超过 Python 默认递归深度的 AND 链与很长的 IN 列表
+    n = 2000
+    chain = "SELECT id FROM t WHERE " + " AND ".join(f"c{i} = {i}" for i in range(n))
+    changed = chain[:chain.rindex("=")] + "= -1"
+    assert expressions_equal(parse_one(chain), parse_one(chain))
+    assert not expressions_equal(parse_one(chain), parse_one(changed))
+    assert fingerprint(parse_one(chain)) == fingerprint(parse_one(chain))
+
+    values = list(range(n))
+    in_list = "SELECT id FROM t WHERE a IN ({})"
+    assert expressions_equal(parse_one(in_list.format(", ".join(map(str, values)))),
+                             parse_one(in_list.format(", ".join(map(str, reversed(values))))))
+
+CORPUS = [
+    "SELECT a, b FROM t",
+    "SELECT b, a FROM t",
+    "SELECT a, a, b FROM t",
+    "SELECT a, b, b FROM t",
+    "SELECT a FROM t GROUP BY a, b",
+    "SELECT a FROM t GROUP BY b, a",
+    "SELECT a + 1, b FROM t",
+    "SELECT b, 1 + a FROM t",
+    "SELECT x.a FROM t AS x JOIN u AS y ON x.id = y.id",
+    "SELECT x.a FROM u AS y JOIN t AS x ON x.id = y.id",
+]
+
+def reference_lists_equal(list1, list2):
+    # 逐个尝试配对的无序比较（指纹分桶之前的做法）
+    remaining = list(list2)
+    for item1 in list1:
+        for i, item2 in enumerate(remaining):
+            if expressions_equal(item1, item2):
+                remaining.pop(i)
+                break
+        else:
+            return False
+    return not remaining
+
+@pytest.mark.parametrize("sql1", CORPUS)
+def test_fingerprint_buckets_agree_with_pairwise_matching(sql1):
+    expr1 = parse_one(sql1)
+    for sql2 in CORPUS:
+        expr2 = parse_one(sql2)
+        equal = expressions_equal(expr1, expr2)
+        # 结构相等时指纹一定相同
+        assert not equal or fingerprint(expr1) == fingerprint(expr2)
+        assert compare_lists_unordered(expr1.expressions, expr2.expressions) == reference_lists_equal(expr1.expressions, expr2.expressions)
+
+def test_unordered_lists_keep_multiplicity():
+    assert is_equi_match("SELECT a, b FROM t", "SELECT b, a FROM t")
+    assert is_equi_match("SELECT a FROM t GROUP BY a, b", "SELECT a FROM t GROUP BY b, a")
+    assert not is_equi_match("SELECT a, a, b FROM t", "SELECT a, b, b FROM t")
+
+GOLD_CTE = "WITH s AS (SELECT id FROM emp WHERE x > 1), r AS (SELECT id FROM dept) SELECT s.id FROM s JOIN r ON s.id = r.id"
+
+@pytest.mark.parametrize("pred_sql, mapping, matched", [
+    ("WITH q AS (SELECT id FROM dept), w AS (SELECT id FROM emp WHERE x > 1) SELECT w.id FROM w JOIN q ON w.id = q.id",
+     {"s": "w", "r": "q"}, True),
+    ("WITH q AS (SELECT id FROM dept), w AS (SELECT id FROM emp WHERE x > 2) SELECT w.id FROM w JOIN q ON w.id = q.id",
+     {"r": "q"}, False),
+])
+def test_aliases_are_matched_by_structure(pred_sql, mapping, matched):
+    gold_map, pred_map = get_alias_map(parse_one(GOLD_CTE)), get_alias_map(parse_one(pred_sql))
+    assert match_aliases(gold_map, pred_map) == mapping
+    # 与逐对比较全部别名的结果相同
+    assert mapping == {alias1: alias2 for alias1, node1 in gold_map.items() for alias2, node2 in pred_map.items()
+                       if expressions_equal(node1, node2)}
+    assert is_equi_match(GOLD_CTE, pred_sql) == matched
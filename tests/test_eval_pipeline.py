@@ -0,0 +1,62 @@
+import time
+import random
+import threading
+import pytest
+from EvalPipeline import iter_pipeline, timed
+
+def sleepy(name, seconds):
+    def stage(row):
+        time.sleep(random.Random(row["i"]).random() * seconds)
+        row[name] = True
+        return row
+    return stage
+
+def test_rows_come_out_in_input_order_after_every_stage():
+    rows = [{"i": i} for i in range(40)]
+    stages = [("a", sleepy("a", 0.005), 4), ("b", sleepy("b", 0.005), 2)]
+    out = list(iter_pipeline(iter(rows), stages, queue_size=4))
+    assert [row["i"] for row in out] == list(range(40))
+    assert all(row["a"] and row["b"] for row in out)
+
+def test_stages_overlap():
+    rows = [{"i": i} for i in range(8)]
+    stages = [(name, timed(name, lambda row: time.sleep(0.05) or row), 1) for name in ("a", "b")]
+    start = time.perf_counter()
+    out = list(iter_pipeline(rows, stages))
+    # 串行需要 8 * 2 * 0.05 = 0.8 秒，流水线约为 (8 + 1) * 0.05 秒
+    assert time.perf_counter() - start < 0.7
+    assert all(row["a_seconds"] >= 0.05 and row["b_seconds"] >= 0.05 for row in out)
+
+def test_skipped_rows_bypass_stages():
+    def stage(row):
+        row["scored"] = True
+        return row
+    out = list(iter_pipeline(({"i": i} for i in range(6)), [("a", stage, 2)], skip=lambda row: row["i"] % 2))
+    assert [(row["i"], "scored" in row) for row in out] == [(i, i % 2 == 0) for i in range(6)]
+
+def test_failed_rows_are_dropped_and_the_first_error_is_raised():
+    def stage(row):
+        if row["i"] in (2, 4):
+            raise ValueError(row["i"])
+        return row
+    out = []
+    with pytest.raises(ValueError, match="2"):
+        for row in iter_pipeline(({"i": i} for i in range(6)), [("a", stage, 2)]):
+            out.append(row["i"])
+    assert out == [0, 1, 3, 5]
+
+def test_breaking_early_stops_threads_and_bounds_reads():
+    read = []
+
+    def rows():
+        for i in range(10000):
+            read.append(i)
+            yield {"i": i}
+
+    before = threading.active_count()
+    for row in iter_pipeline(rows(), [("a", lambda row: row, 2)], queue_size=2, max_in_flight=8):
+        if row["i"] == 3:
+            break
+    assert threading.active_count() == before
+    # 在途的行数有上限，提前结束时没有读完输入
+    assert len(read) < 100
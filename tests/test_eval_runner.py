@@ -0,0 +1,101 @@
+import os
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+import evalText2SQL
+import evalText2SQL_with_Err
+from Instrument import COLUMNS
+
+# 问题 -> 预测SQL；q2 与 q1、q4 与 q3 规范化后相同，只有关键字大小写和空白不同
+ANSWERS = {
+    "q1": "SELECT nosuch FROM t",
+    "q2": "select  nosuch from t;",
+    "q3": "SELECT id FROM t",
+    "q4": "select id  from t",
+    "q5": "SELECT id, name FROM t",
+}
+
+@pytest.fixture(scope="module")
+def api_url():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            question = parse_qs(urlparse(self.path).query)["question"][0]
+            payload = json.dumps({"type": "sql", "text": ANSWERS[question]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/v0/generate_sql"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def dataset(tmp_path):
+    db_path = str(tmp_path / "t.sqlite")
+    connection = sqlite3.connect(db_path)
+    connection.execute("CREATE TABLE t (id INTEGER, name TEXT)")
+    connection.executemany("INSERT INTO t VALUES (?, ?)", [(1, "a"), (2, "b")])
+    connection.commit()
+    connection.close()
+    dataset_path = tmp_path / "dataset.csv"
+    dataset_path.write_text("query,gold_sql\n" + "".join(f"{q},SELECT id FROM t\n" for q in ANSWERS), encoding="utf-8")
+    return str(dataset_path), db_path
+
+def test_reused_messages_refer_to_the_row_sql(dataset, api_url, capsys):
+    dataset_path, db_path = dataset
+    df, _, _ = evalText2SQL_with_Err.evalText2SQL(dataset_path, db_path, api_url=api_url)
+    assert "Execution failed on sql 'SELECT nosuch FROM t'" in df['exec_msg'][0]
+    assert "Execution failed on sql 'select  nosuch from t;'" in df['exec_msg'][1]
+    # 没有信息的结果照常复用
+    assert "Dedup Exec-Match: 4/5 unique, 20.00% reused" in capsys.readouterr().out
+
+def test_scores_are_not_reused_across_calls(dataset, api_url):
+    dataset_path, db_path = dataset
+    strict, _, strict_exec = evalText2SQL.evalText2SQL(dataset_path, db_path, api_url=api_url)
+    loose, _, loose_exec = evalText2SQL.evalText2SQL(dataset_path, db_path, api_url=api_url, ignore_extra_columns=True)
+    assert list(strict['exec_match']) == [False, False, True, True, False]
+    assert list(loose['exec_match']) == [False, False, True, True, True]
+    assert (strict_exec, loose_exec) == (0.4, 0.6)
+
+def test_order_by_spelling_is_part_of_the_dedup_key(dataset, api_url):
+    _, db_path = dataset
+    # 两条真实SQL规范化后相同，但只有第二条按原始文本被识别为 ORDER BY（比较行序）
+    dataset_path = os.path.join(os.path.dirname(db_path), "ordered.csv")
+    with open(dataset_path, "w", encoding="utf-8") as file:
+        file.write('query,gold_sql\nq3,SELECT id FROM t ORDER  BY id DESC\nq3,SELECT id FROM t ORDER BY id DESC\n')
+    df, _, _ = evalText2SQL.evalText2SQL(dataset_path, db_path, api_url=api_url)
+    assert list(df['exec_match']) == [True, False]
+
+def test_checkpoint_depends_on_prefilter_and_keeps_output_columns(dataset, api_url, tmp_path, capsys):
+    dataset_path, db_path = dataset
+    checkpoint_path = str(tmp_path / "checkpoint.jsonl")
+    output_path = str(tmp_path / "out.csv")
+    evalText2SQL.evalText2SQL(dataset_path, db_path, api_url=api_url, checkpoint_path=checkpoint_path, instrument=True)
+    capsys.readouterr()
+
+    evalText2SQL.evalText2SQL(dataset_path, db_path, api_url=api_url, checkpoint_path=checkpoint_path, output_path=output_path)
+    assert "Resuming from checkpoint: 5 rows already scored" in capsys.readouterr().out
+    # 恢复的行不带上次开启 instrument 时的额外列
+    with open(output_path, encoding="utf-8") as file:
+        assert file.readline().strip() == "query,gold_sql,predict_sql,equi_match,exec_match"
+
+    evalText2SQL.evalText2SQL(dataset_path, db_path, api_url=api_url, checkpoint_path=checkpoint_path, prefilter=False)
+    assert "Resuming from checkpoint" not in capsys.readouterr().out
+
+def test_instrument_adds_metric_columns_and_profiles_slowest_rows(dataset, api_url, capsys):
+    dataset_path, db_path = dataset
+    df, _, _ = evalText2SQL.evalText2SQL(dataset_path, db_path, api_url=api_url, instrument=True, profile_slowest=2)
+    assert all(column in df.columns for column in COLUMNS)
+    assert (df[COLUMNS] >= 0).all().all()
+    out = capsys.readouterr().out
+    assert "Stage timings:" in out and "Profile of the 2 slowest rows:" in out
@@ -0,0 +1,65 @@
+import itertools
+import sqlite3
+import threading
+import pytest
+import ExecBatch
+import ExecMatch_with_Err
+from ExecBatch import batch_exec_match
+from GoldPack import build_gold_pack
+from SQLitePool import close_pool
+
+GOLD_SQLS = ["SELECT id, name FROM t", "SELECT name FROM t ORDER BY id DESC", "SELECT COUNT(*) FROM t", "SELECT nosuch FROM t"]
+PRED_SQLS = ["SELECT name, id FROM t", "SELECT name FROM t ORDER BY id", "SELECT COUNT(id) FROM t", "SELECT id FROM t", "SELECT bad FROM t"]
+PAIRS = list(itertools.product(PRED_SQLS, GOLD_SQLS))
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "t.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE t (id INTEGER, name TEXT)")
+    connection.executemany("INSERT INTO t VALUES (?, ?)", [(1, "a"), (2, "b"), (3, None)])
+    connection.commit()
+    connection.close()
+    yield path
+    close_pool(path)
+
+@pytest.mark.parametrize("options", [{}, {"ignore_extra_columns": True}, {"verify": True}, {"streaming": True}, {"streaming": True, "verify": True}])
+@pytest.mark.parametrize("packed", [False, True])
+def test_batch_matches_serial_exec_match(db_path, options, packed):
+    gold_signatures = None
+    if packed:
+        pack = build_gold_pack(GOLD_SQLS, db_path)
+        gold_signatures = [pack.exec_signatures(gold_sql) for _, gold_sql in PAIRS]
+    serial = [ExecMatch_with_Err.is_exec_match(pred_sql, gold_sql, db_path, gold_signatures=None if gold_signatures is None else gold_signatures[i], **options)
+              for i, (pred_sql, gold_sql) in enumerate(PAIRS)]
+    for workers in (1, 3):
+        assert batch_exec_match(PAIRS, db_path, gold_signatures=gold_signatures, workers=workers, **options) == serial
+
+def test_batch_bounds_queries_in_flight(db_path, monkeypatch):
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+    execute_sql = ExecBatch.execute_sql
+
+    def counting(*args):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        return execute_sql(*args)
+
+    def compare(pred_result, gold_result, *args):
+        # 比较完成时这一行的两条查询结束
+        with lock:
+            state["running"] -= 2
+        return True, None
+
+    monkeypatch.setattr(ExecBatch, "execute_sql", counting)
+    monkeypatch.setattr(ExecBatch, "compare_exec_results", compare)
+    batch_exec_match(PAIRS * 5, db_path, workers=2)
+    assert state["peak"] <= 4
+
+def test_batch_verify_rules_out_signature_collisions(db_path):
+    pred_sql, gold_sql = "SELECT id FROM t", "SELECT COUNT(*) FROM t"
+    # 模拟摘要碰撞：真实SQL的签名与预测结果的签名相同
+    signatures = build_gold_pack([pred_sql], db_path).exec_signatures(pred_sql)
+    assert batch_exec_match([(pred_sql, gold_sql)], db_path, gold_signatures=[signatures])[0][0]
+    assert not batch_exec_match([(pred_sql, gold_sql)], db_path, gold_signatures=[signatures], verify=True)[0][0]
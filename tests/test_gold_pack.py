@@ -0,0 +1,75 @@
+import sqlite3
+import itertools
+import pytest
+import ExecMatch
+import ExecMatch_with_Err
+from GoldPack import build_gold_pack, build_exec_entry
+from SQLitePool import close_pool, get_connection
+
+GOLD_SQLS = [
+    "SELECT a, b FROM t",
+    "SELECT a, NULL AS n FROM t ORDER BY id",
+    "SELECT b, c FROM t",
+    "SELECT id FROM t",
+    "SELECT nosuch FROM t",
+]
+PRED_SQLS = [
+    "SELECT a, b FROM t",
+    "SELECT b, a FROM t",
+    "SELECT a, NULL AS n FROM t ORDER BY id",
+    "SELECT NULL AS n, a FROM t ORDER BY id",
+    "SELECT id, a, b FROM t",
+    "SELECT c, b FROM t",
+    "SELECT id FROM t",
+    "SELECT bad FROM t",
+]
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "nulls.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE t (id INTEGER, a INTEGER, b TEXT, c REAL)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?, ?)",
+                           [(1, 1, "x", None), (2, None, None, 1.5), (3, 2, "y", None)])
+    connection.commit()
+    connection.close()
+    yield path
+    close_pool(path)
+
+@pytest.mark.parametrize("module, diagnostics", [(ExecMatch, "off"), (ExecMatch_with_Err, "full"), (ExecMatch_with_Err, "summary")])
+@pytest.mark.parametrize("ignore_extra_columns, streaming", list(itertools.product([False, True], repeat=2)))
+def test_pack_verdicts_equal_live_verdicts_with_nulls(db_path, module, diagnostics, ignore_extra_columns, streaming):
+    pack = build_gold_pack(GOLD_SQLS, db_path)
+    options = dict(ignore_extra_columns=ignore_extra_columns, streaming=streaming, diagnostics=diagnostics)
+    for gold_sql, pred_sql in itertools.product(GOLD_SQLS, PRED_SQLS):
+        live = module.is_exec_match(pred_sql, gold_sql, db_path, **options)
+        packed = module.is_exec_match(pred_sql, gold_sql, db_path, gold_signatures=pack.exec_signatures(gold_sql), **options)
+        assert packed == live, (pred_sql, gold_sql)
+
+def test_exec_entry_runs_gold_once(db_path):
+    connection = get_connection(db_path)
+    statements = []
+    connection.set_trace_callback(statements.append)
+    try:
+        entry = build_exec_entry("SELECT b, c FROM t", connection)
+    finally:
+        connection.set_trace_callback(None)
+    assert statements == ["SELECT b, c FROM t"]
+    assert entry["seconds"] >= 0
+    # NULL 在 pandas 中为 NaN，逐列比较的签名无法表示，评测时照常执行
+    assert "ExecMatch" not in entry and "stream" in entry
+    assert "ExecMatch" in build_exec_entry("SELECT id, b FROM t WHERE b IS NOT NULL", connection)
+
+def test_exec_entry_over_budget_has_no_signatures(db_path):
+    slow = "WITH RECURSIVE r(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r) SELECT COUNT(*) FROM r"
+    assert build_exec_entry(slow, get_connection(db_path), max_steps=10000) == {}
+
+@pytest.mark.parametrize("module, rules", [(ExecMatch, "ExecMatch"), (ExecMatch_with_Err, "ExecMatch_with_Err")])
+def test_verify_rules_out_signature_collisions(db_path, module, rules):
+    gold_sql, pred_sql = "SELECT id FROM t", "SELECT a FROM t WHERE a IS NOT NULL"
+    # 模拟摘要碰撞：真实SQL的签名与预测结果的签名相同
+    signatures = {rules: build_exec_entry(pred_sql, get_connection(db_path))[rules]}
+    options = dict(gold_signatures=signatures, diagnostics="off")
+    assert module.is_exec_match(pred_sql, gold_sql, db_path, diagnostics="off") in (False, (False, None))
+    assert module.is_exec_match(pred_sql, gold_sql, db_path, **options) in (True, (True, None))
+    assert module.is_exec_match(pred_sql, gold_sql, db_path, verify=True, **options) in (False, (False, None))
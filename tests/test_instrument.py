@@ -0,0 +1,63 @@
+import threading
+from Instrument import COLUMNS, recording, measure, record_size, fill_columns, StageStats, SlowestRows, profile_rows
+
+def test_measure_accumulates_only_while_recording():
+    with measure("parse"):
+        pass  # 未开启记录时什么也不做
+    metrics = {}
+    with recording(metrics):
+        for _ in range(2):
+            with measure("parse"):
+                pass
+        record_size("result_rows", 3)
+        record_size("result_rows", 4)
+    with measure("parse"):
+        pass
+    assert set(metrics) == {"parse_seconds", "result_rows"}
+    assert metrics["result_rows"] == 7
+
+def test_recording_is_per_thread():
+    metrics = {}
+    other = {}
+
+    def run():
+        with recording(other):
+            with measure("sqlite"):
+                pass
+
+    with recording(metrics):
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    assert metrics == {} and "sqlite_seconds" in other
+
+def test_fill_columns():
+    row = fill_columns({"equi_seconds": 0.5})
+    assert all(column in row for column in COLUMNS)
+    assert row["equi_seconds"] == 0.5 and row["result_rows"] == 0
+
+def test_stage_stats_percentiles():
+    stats = StageStats()
+    for i in range(1, 101):
+        stats.add({"equi_seconds": i / 1000, "exec_seconds": 0.5})
+    summary = stats.summary()
+    assert set(summary) == {"equi", "exec"}
+    assert (summary["equi"]["count"], summary["equi"]["p50"], summary["equi"]["p95"], summary["equi"]["max"]) == (100, 0.05, 0.095, 0.1)
+    assert len(stats.format().splitlines()) == 3
+
+def test_stage_stats_sample_is_bounded():
+    stats = StageStats(max_samples=10)
+    for i in range(1000):
+        stats.add({"equi_seconds": float(i)})
+    assert len(stats.samples["equi"]) == 10
+    assert (stats.count["equi"], stats.maximum["equi"]) == (1000, 999.0)
+
+def test_slowest_rows_and_profile():
+    slowest = SlowestRows(2)
+    for i, cost in enumerate([0.1, 0.5, 0.2, 0.4]):
+        slowest.add({"i": i, "equi_seconds": cost, "exec_seconds": 0.0})
+    assert [row["i"] for _, row in slowest.rows] == [1, 3]
+
+    scored = []
+    report = profile_rows([row for _, row in slowest.rows], lambda row: scored.append(row["i"]))
+    assert scored == [1, 3] and "cumulative" in report
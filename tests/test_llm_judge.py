@@ -0,0 +1,117 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from EquiMatch_with_LLM import LLMJudge, parse_verdict, RETRY_PROMPT
+
+VALID = '分析……\n```json\n{"result": true, "reason": "same"}\n```'
+MALFORMED = "I think they are equivalent."
+
+class MockOpenAI:
+    """
+    本地 OpenAI 兼容接口（/v1/chat/completions）：按 `replies` 依次返回回复内容，用完后重复最后一个；记录收到的消息。
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                mock.requests.append(body["messages"])
+                content = mock.replies[min(len(mock.requests), len(mock.replies)) - 1]
+                payload = json.dumps({
+                    "id": "mock", "object": "chat.completion", "created": 0, "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def judge(self, **options):
+        return LLMJudge(self.base_url, "not_used", "mock-model", max_retries=0, **options)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def mock_llm():
+    mocks = []
+
+    def start(replies):
+        mocks.append(MockOpenAI(replies))
+        return mocks[-1]
+    yield start
+    for mock in mocks:
+        mock.close()
+
+def test_parse_verdict():
+    assert parse_verdict(VALID) == {"result": True, "reason": "same"}
+    assert parse_verdict('结论 {"result": false, "reason": "filter"}') == {"result": False, "reason": "filter"}
+    with pytest.raises(ValueError):
+        parse_verdict(MALFORMED)
+    with pytest.raises(ValueError):
+        parse_verdict('```json\n{"result": "yes"}\n```')
+
+def test_retry_after_unparseable_reply(mock_llm):
+    mock = mock_llm([MALFORMED, VALID])
+    with mock.judge() as judge:
+        verdict = judge("SELECT 1", "SELECT 1")
+        assert verdict == {"result": True, "reason": "same", "cached": False}
+        assert judge.stats["requests"] == 2
+        assert judge.stats["parse_retries"] == 1
+    # 追问时带上原回复和错误提示
+    retry = mock.requests[1]
+    assert retry[-2] == {"role": "assistant", "content": MALFORMED}
+    assert retry[-1]["content"].startswith(RETRY_PROMPT.split("（")[0])
+
+def test_malformed_reply_is_not_cached(mock_llm):
+    mock = mock_llm([MALFORMED])
+    with mock.judge(parse_retries=1) as judge:
+        verdict = judge("SELECT 1", "SELECT 2")
+        assert verdict["result"] is None
+        assert "Unparseable" in verdict["reason"]
+        assert judge.stats["failures"] == 1
+        assert len(judge.cache) == 0
+    assert len(mock.requests) == 2
+
+def test_cache_hit_miss_and_prompt_version(mock_llm, tmp_path):
+    mock = mock_llm([VALID])
+    cache_path = tmp_path / "verdicts.jsonl"
+    with mock.judge(cache_path=str(cache_path)) as judge:
+        assert judge("SELECT a FROM t", "SELECT a FROM t")["cached"] is False
+        # 空白和大小写不同的相同 SQL 命中缓存
+        assert judge("select a  from t", "SELECT a FROM t")["cached"] is True
+        assert judge.stats["cache_hits"] == 1
+    assert len(mock.requests) == 1
+
+    # 持久化的缓存在新实例中可用
+    with mock.judge(cache_path=str(cache_path)) as judge:
+        assert judge("SELECT a FROM t", "SELECT a FROM t") == {"result": True, "reason": "same", "cached": True}
+    assert len(mock.requests) == 1
+
+    # 提示词版本变化后旧结论不再使用
+    with mock.judge(cache_path=str(cache_path), prompt_version="test-2") as judge:
+        assert judge("SELECT a FROM t", "SELECT a FROM t")["cached"] is False
+    assert len(mock.requests) == 2
+
+def test_judge_many_preserves_order(mock_llm):
+    mock = mock_llm([VALID])
+    pairs = [(f"SELECT {i}", f"SELECT {i}") for i in range(5)] + [("SELECT 0", "SELECT 0")]
+    with mock.judge(concurrency=2) as judge:
+        verdicts = judge.judge_many(pairs)
+    assert [verdict["result"] for verdict in verdicts] == [True] * 6
+    # 相同的判断只请求一次
+    assert len(mock.requests) == 5
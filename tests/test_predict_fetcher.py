@@ -0,0 +1,94 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+import PredictFetcher
+from PredictFetcher import make_session, fetch_prediction
+
+class StubServer:
+    """
+    本地替身生成接口：按 `responses` 依次返回 (状态码, 响应体)，用完后重复最后一个；记录收到的问题。
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.questions = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.questions.append(parse_qs(urlparse(self.path).query)["question"][0])
+                index = min(len(stub.questions), len(stub.responses)) - 1
+                status, body = stub.responses[index]
+                payload = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/v0/generate_sql"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # 记录退避等待时间，不真正等待
+    calls = []
+    monkeypatch.setattr(PredictFetcher.time, "sleep", calls.append)
+    return calls
+
+def test_success():
+    with StubServer([(200, {"type": "sql", "text": "SELECT 1"})]) as stub:
+        session = make_session(2)
+        assert fetch_prediction(session, stub.url, "问题") == {"type": "sql", "text": "SELECT 1"}
+        session.close()
+    assert stub.questions == ["问题"]
+
+def test_retries_5xx_with_backoff(sleeps):
+    responses = [(500, "boom"), (503, "busy"), (200, {"type": "sql", "text": "SELECT 2"})]
+    with StubServer(responses) as stub:
+        result = fetch_prediction(make_session(), stub.url, "q", retries=3, backoff=0.5)
+    assert result == {"type": "sql", "text": "SELECT 2"}
+    assert len(stub.questions) == 3
+    assert sleeps == [0.5, 1.0]
+
+def test_500_exhausts_retries(sleeps):
+    with StubServer([(500, "boom")]) as stub:
+        result = fetch_prediction(make_session(), stub.url, "q", retries=2, backoff=0.25)
+    assert result["type"] == "error"
+    assert "500" in result["text"]
+    assert len(stub.questions) == 3
+    assert sleeps == [0.25, 0.5]
+
+def test_4xx_is_not_retried(sleeps):
+    with StubServer([(404, "missing")]) as stub:
+        result = fetch_prediction(make_session(), stub.url, "q", retries=3)
+    assert result["type"] == "error"
+    assert len(stub.questions) == 1
+    assert sleeps == []
+
+def test_invalid_json_is_not_retried(sleeps):
+    with StubServer([(200, "not json")]) as stub:
+        result = fetch_prediction(make_session(), stub.url, "q", retries=3)
+    assert result["type"] == "error"
+    assert len(stub.questions) == 1
+
+def test_connection_error_is_retried(sleeps):
+    with StubServer([(200, {})]) as stub:
+        url = stub.url
+    # 服务已关闭，每次请求都是连接错误
+    result = fetch_prediction(make_session(), url, "q", timeout=1, retries=2, backoff=0.1)
+    assert result["type"] == "error"
+    assert sleeps == [0.1, 0.2]
@@ -0,0 +1,61 @@
+import itertools
+import sqlite3
+import pytest
+import ExecMatch
+from EquiMatch import is_equi_match, compare_sql, get_alias_map
+from SQLCache import SQLCache
+from SQLitePool import close_pool
+
+# 等价与不等价的写法混在一起：CTE / 子查询 / 外连接在优化时可能被删减或解嵌套，快速判定不能因此误判
+SQLS = [
+    "SELECT id, name FROM emp",
+    "SELECT e.id, e.name FROM emp AS e",
+    "SELECT id, name FROM (SELECT id, name, salary FROM emp) AS s",
+    "WITH s AS (SELECT id, name FROM emp) SELECT id, name FROM s",
+    "WITH unused AS (SELECT * FROM dept) SELECT id, name FROM emp",
+    "SELECT emp.id, emp.name FROM emp LEFT JOIN (SELECT id FROM dept) AS d ON emp.dept = d.id",
+    "SELECT id, name FROM emp WHERE dept IN (SELECT id FROM dept)",
+    "SELECT id, name FROM emp WHERE salary > (SELECT AVG(salary) FROM emp)",
+    "SELECT dept, COUNT(*) FROM emp GROUP BY dept",
+    "SELECT dept, COUNT(id) FROM emp GROUP BY dept",
+    "SELECT DISTINCT dept FROM emp",
+    "SELECT dept FROM emp GROUP BY dept",
+    "SELECT id, ROW_NUMBER() OVER (ORDER BY salary) FROM emp",
+    "SELECT id, name FROM emp UNION SELECT id, dname FROM dept",
+    "SELECT id, name FROM emp UNION ALL SELECT id, dname FROM dept",
+    "SELECT * FROM emp",
+    "SELECT id, name, dept, salary FROM emp",
+    "SELECT id FROM dept",
+]
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "t.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE emp (id INTEGER, name TEXT, dept INTEGER, salary REAL)")
+    connection.execute("CREATE TABLE dept (id INTEGER, dname TEXT)")
+    connection.executemany("INSERT INTO emp VALUES (?, ?, ?, ?)", [(1, "a", 1, 10.0), (2, "b", 2, 20.0), (3, "c", 1, 30.0)])
+    connection.executemany("INSERT INTO dept VALUES (?, ?)", [(1, "x"), (2, "y")])
+    connection.commit()
+    connection.close()
+    yield path
+    close_pool(path)
+
+@pytest.mark.parametrize("sql1, sql2", list(itertools.product(SQLS, repeat=2)))
+def test_equi_prefilter_never_rejects_a_match(sql1, sql2):
+    full = is_equi_match(sql1, sql2)
+    assert is_equi_match(sql1, sql2, prefilter=True) == full
+    if full:
+        # 快速判定本身也不能拒绝（而不只是最终结论相同）
+        comparison = compare_sql(sql1, sql2, cache=SQLCache(get_alias_map), prefilter=True)
+        assert comparison.mismatch is None or comparison.mismatch.kind != "prefilter"
+
+def test_equi_prefilter_rejects_without_optimizing():
+    comparison = compare_sql("SELECT id FROM emp", "SELECT id, name FROM emp", cache=SQLCache(get_alias_map), prefilter=True)
+    assert not comparison.matched
+    assert comparison.mismatch.kind == "prefilter" and comparison.mismatch.context == "arity"
+
+def test_exec_prefilter_keeps_verdicts(db_path):
+    for pred_sql, gold_sql in itertools.product(SQLS, repeat=2):
+        full = ExecMatch.is_exec_match(pred_sql, gold_sql, db_path)
+        assert ExecMatch.is_exec_match(pred_sql, gold_sql, db_path, prefilter=True) == full, (pred_sql, gold_sql)
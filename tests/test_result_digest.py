@@ -0,0 +1,60 @@
+import sqlite3
+import pytest
+from ResultDigest import StreamDigest, stream_digest, aggregate_digest, DigestUnavailable
+from ExecMatch import execute_digest
+from SQLitePool import QueryTimeout
+
+def signature(rows, column_count, ordered=False):
+    digest = StreamDigest(column_count, ordered)
+    for row in rows:
+        digest.add(row)
+    return digest.signature()
+
+ROWS = [(1, "a", None), (2, None, 1.5), (1, "a", None), (None, None, None)]
+
+def test_multiset_equality_ignores_row_and_column_order():
+    shuffled = [ROWS[2], ROWS[3], ROWS[0], ROWS[1]]
+    reordered = [(c, a, b) for a, b, c in shuffled]
+    assert signature(shuffled, 3) == signature(ROWS, 3)
+    assert signature(reordered, 3) == signature(ROWS, 3)
+    assert signature(ROWS, 3, ordered=True) != signature(shuffled, 3, ordered=True)
+
+@pytest.mark.parametrize("other", [
+    ROWS[:3],                                      # 少一个全为 NULL 的行
+    ROWS[1:] + [ROWS[1]],                          # 重复的行不同
+    [(1, "a", None), (2, None, 1.5), (1, "a", None), (None, None, "")],  # NULL 与空字符串不同
+    [(1, "a", None), (2, None, 1.5), (1, None, "a"), (None, None, None)],  # 行内的值相同但所在列不同
+])
+def test_multiset_inequality(other):
+    assert signature(other, 3) != signature(ROWS, 3)
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE t (a INTEGER, b TEXT, c REAL)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?)", ROWS)
+    yield connection
+    connection.close()
+
+@pytest.mark.parametrize("sql", ["SELECT * FROM t", "SELECT a, a FROM t", "SELECT b FROM t WHERE a > 5", "SELECT * FROM t;"])
+def test_aggregate_digest_equals_stream_digest(connection, sql):
+    assert aggregate_digest(connection, sql) == stream_digest(connection.execute(sql.rstrip(";")))
+
+def test_aggregate_digest_unavailable(connection):
+    with pytest.raises(DigestUnavailable):
+        aggregate_digest(connection, "PRAGMA table_info(t)")
+    # 无法包装时退回逐行读取
+    assert execute_digest("PRAGMA table_info(t)", connection) == stream_digest(connection.execute("PRAGMA table_info(t)"))
+
+def test_execution_errors_are_not_retried(connection):
+    statements = []
+    connection.set_trace_callback(statements.append)
+    try:
+        result = execute_digest("SELECT abs(-9223372036854775807 - a) FROM t", connection)
+        slow = execute_digest("WITH RECURSIVE r(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r) SELECT n FROM r", connection, max_steps=10000)
+    finally:
+        connection.set_trace_callback(None)
+    assert isinstance(result, sqlite3.Error)
+    assert isinstance(slow, QueryTimeout)
+    # 每条查询只有取列名和聚合两次包装执行，没有退回原查询
+    assert len(statements) == 4 and all(statement.startswith("SELECT") and "FROM (" in statement for statement in statements)
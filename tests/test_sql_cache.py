@@ -0,0 +1,39 @@
+import pytest
+from sqlglot import parse_one
+from sqlglot.optimizer import optimize
+from EquiMatch import get_alias_map, compare_sql
+from SQLCache import SQLCache
+
+def test_hits_misses_and_lru_eviction():
+    cache = SQLCache(get_alias_map, maxsize=2)
+    first = cache.get("SELECT a FROM t")
+    assert cache.get("SELECT a FROM t") is first
+    cache.get("SELECT b FROM t")
+    cache.get("SELECT a FROM t")  # a 成为最近使用
+    cache.get("SELECT c FROM t")  # 淘汰 b
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (2, 3, 1, 2)
+    assert cache.get("SELECT a FROM t") is first
+    assert cache.stats()["misses"] == 3
+
+def test_pinned_entries_are_not_evicted():
+    cache = SQLCache(get_alias_map, maxsize=1)
+    pinned = cache.pin("SELECT a FROM t", "sqlite", optimize(parse_one("SELECT a FROM t")), build_seconds=0.5)
+    cache.get("SELECT b FROM t")
+    cache.get("SELECT c FROM t")
+    assert cache.get("SELECT a FROM t") is pinned
+    assert cache.stats()["saved_seconds"] == 0.5
+
+def test_parse_errors_are_not_cached():
+    cache = SQLCache(get_alias_map)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            cache.get("SELECT FROM WHERE (")
+    assert cache.stats()["size"] == 0
+
+def test_alias_replacement_does_not_modify_cached_trees():
+    cache = SQLCache(get_alias_map)
+    gold = "WITH s AS (SELECT id FROM emp) SELECT s.id FROM s"
+    before = cache.get(gold).expression.sql()
+    assert compare_sql(gold, "WITH w AS (SELECT id FROM emp) SELECT w.id FROM w", cache=cache).matched
+    assert cache.get(gold).expression.sql() == before
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import threading
+import pytest
+import SQLitePool
+from SQLitePool import ConnectionPool, get_pool, close_pool, query_budget, QueryTimeout
+import ExecMatch
+import ExecMatch_with_Err
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "t.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE t (id INTEGER, name TEXT)")
+    connection.executemany("INSERT INTO t VALUES (?, ?)", [(1, "a"), (2, "b")])
+    connection.commit()
+    connection.close()
+    return path
+
+def test_missing_database_is_a_failed_match(tmp_path):
+    missing = str(tmp_path / "missing.sqlite")
+    assert ExecMatch.is_exec_match("SELECT 1", "SELECT 1", missing) is False
+    match, message = ExecMatch_with_Err.is_exec_match("SELECT 1", "SELECT 1", missing)
+    assert match is False
+    assert message == "Error executing SQL query: unable to open database file"
+    close_pool(missing)
+
+def test_connections_of_finished_threads_are_closed(db_path):
+    pool = ConnectionPool(db_path)
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(pool.connection()))
+    thread.start()
+    thread.join()
+    assert len(pool._connections) == 1
+
+    # 下一次创建连接时关闭已结束线程的连接
+    pool.connection()
+    assert [connection for _, connection in pool._connections] != connections
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute("SELECT 1")
+    pool.close()
+
+def test_close_pool(db_path):
+    pool = get_pool(db_path)
+    connection = pool.connection()
+    close_pool(db_path)
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute("SELECT 1")
+    assert get_pool(db_path) is not pool
+    close_pool(db_path)
+    assert not any(key[0] == os.path.abspath(db_path) for key in SQLitePool._pools)
+
+def test_memory_load_gives_each_thread_a_private_copy(db_path):
+    pool = ConnectionPool(db_path, load="memory")
+    results = {}
+    barrier = threading.Barrier(3)
+
+    def run(name):
+        connection = pool.connection()
+        results[name] = (connection, connection.execute("SELECT COUNT(*) FROM t").fetchone()[0],
+                         connection.execute("PRAGMA database_list").fetchone()[2])
+        barrier.wait()  # 三个线程同时存活，连接都未被释放
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [count for _, count, _ in results.values()] == [2, 2, 2]
+    # 每个线程一个私有的内存数据库（文件名为空），不经过共享缓存
+    assert len({id(connection) for connection, _, _ in results.values()}) == 3
+    assert all(file == "" for _, _, file in results.values())
+    # 读入的一份加上每个线程的一份
+    stats = pool.load_stats
+    assert (stats["copies"], stats["total_bytes"]) == (4, 4 * stats["bytes"])
+    pool.release_finished()
+    assert (stats["copies"], stats["peak_bytes"]) == (1, 4 * stats["bytes"])
+    pool.close()
+    assert stats["total_bytes"] == 0
+
+def test_mmap_load_counts_one_copy(db_path):
+    pool = ConnectionPool(db_path, load="mmap")
+    threads = [threading.Thread(target=pool.connection) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.load_stats["total_bytes"] == pool.load_stats["bytes"] == os.path.getsize(db_path)
+    pool.close()
+
+SLOW = "WITH RECURSIVE r(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r) SELECT COUNT(*) FROM r"
+
+@pytest.mark.parametrize("budget", [{"max_steps": 10000}, {"timeout": 0.05}])
+def test_query_budget_raises_query_timeout(budget):
+    connection = sqlite3.connect(":memory:")
+    with pytest.raises(QueryTimeout):
+        with query_budget(connection, **budget):
+            connection.execute(SLOW).fetchone()
+    # 预算只作用于 with 块内，普通错误不会被当作超时
+    assert connection.execute("SELECT 1").fetchone() == (1,)
+    with pytest.raises(sqlite3.OperationalError):
+        with query_budget(connection, **budget):
+            connection.execute("SELECT nosuch")
+    connection.close()
+
+def test_exec_match_reports_timeout(db_path):
+    match, message = ExecMatch_with_Err.is_exec_match(SLOW, "SELECT 1", db_path, max_steps=10000)
+    assert match is False and "Timeout" in message
+    close_pool(db_path)